@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Filter check
+Crawls the HTML pages saved in fixtures/ through every extractor's page parser
+and image filter into a scratch index, without downloading anything, and
+reports any image the filter rejected that still made it into the index.
+Exits non-zero if a rejected image was written or if nothing was filtered.
+Usage: check_filters.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import tempfile
+import importlib
+from utils import CrawlState
+from utils.engine import CrawlEngine, Source, run_extractor
+from utils.parsing import parsers
+from check_parsers import EXTRACTORS, fixture_pages
+
+class RecordingFilter:
+    """Wraps an ImageFilter, remembering the URLs it rejects."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.rejected = set()
+
+    def allows(self, img):
+        allowed = self.inner.allows(img)
+        if not allowed:
+            self.rejected.add(img['url'])
+        return allowed
+
+    def report(self):
+        return self.inner.report()
+
+def check(name, pages, workdir):
+    """Crawl one extractor's fixture pages; return (rejected, leaked) URLs."""
+    module = importlib.import_module(name)
+    parser = next(p for p in parsers if p.extract.__module__ == name)
+    recorder = RecordingFilter(module.SOURCE.filter)
+    source = Source(f'check_{name}',
+                    discover=lambda: [{'url': url} for url in pages],
+                    extract=lambda page: parser(pages[page['url']], page['url']),
+                    download=lambda img, index: True,
+                    filter=recorder)
+    index_path = os.path.join(workdir, f'{name}_index.json')
+    run_extractor(source, index_path, engine=CrawlEngine(parse_workers=0),
+                  state=CrawlState(os.path.join(workdir, f'{name}.sqlite')))
+    with open(index_path) as f:
+        indexed = {img['url'] for img in json.load(f)['images']}
+    return recorder.rejected, recorder.rejected & indexed
+
+def main():
+    by_extractor = {}
+    for extractor, url, html in fixture_pages():
+        by_extractor.setdefault(extractor, {})[url] = html
+
+    rejected = leaked = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in EXTRACTORS:
+            if name not in by_extractor:
+                continue
+            dropped, written = check(name, by_extractor[name], workdir)
+            rejected += len(dropped)
+            leaked += len(written)
+            for url in sorted(written):
+                print(f"  ✗ {name}: {url} was filtered but indexed")
+
+    print(f"\n{rejected} images filtered, {leaked} of them written to the index")
+    if not rejected:
+        print("Nothing was filtered")
+        return 1
+    return 1 if leaked else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Parser parity check
+Runs every extractor's page parser over the HTML pages saved in fixtures/
+(and, given a cache directory, over the HTML pages in that HTTP cache), once
+with the fast parser and once with html.parser, and reports the pages where
+the extracted images differ. Exits non-zero if any page differs or if no page
+was checked at all.
+Usage: check_parsers.py [cache_dir]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import importlib
+from utils import host_of
+from utils.parsing import parsers, check_parity, FAST_PARSER, SAFE_PARSER
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+EXTRACTORS = [
+    'michigan_histology', 'openstax_anatomy', 'pathology_outlines',
+    'uwa_histology', 'webpath', 'webpath_v2',
+]
+
+def fixture_pages(root=FIXTURES_DIR):
+    """Yield (extractor, url, html) for every page listed in fixtures/pages.json."""
+    with open(os.path.join(root, 'pages.json')) as f:
+        pages = json.load(f)
+    for name, url in pages.items():
+        with open(os.path.join(root, name), encoding='utf-8') as f:
+            yield name.split('/')[0], url, f.read()
+
+def saved_pages(root):
+    """Yield (url, html) for every HTML body stored in the cache."""
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(directory, name)
+            try:
+                with open(meta_path) as f:
+                    entry = json.load(f)
+                with open(meta_path[:-5] + '.body', 'rb') as f:
+                    body = f.read()
+            except (OSError, ValueError):
+                continue
+            headers = {k.lower(): v for k, v in (entry.get('headers') or {}).items()}
+            if 'html' not in headers.get('content-type', ''):
+                continue
+            yield entry['url'], body.decode(entry.get('encoding') or 'utf-8', errors='replace')
+
+def main():
+    hosts = {}
+    for name in EXTRACTORS:
+        module = importlib.import_module(name)
+        hosts[name] = host_of(module.BASE_URL)
+
+    # Each page goes to the parsers of the extractor it belongs to
+    pages = list(fixture_pages())
+    print(f"Comparing {FAST_PARSER} with {SAFE_PARSER} on {len(pages)} fixture pages")
+    if len(sys.argv) > 1:
+        print(f"  and on pages saved in {sys.argv[1]}")
+        by_host = {host: name for name, host in hosts.items()}
+        pages += [(by_host.get(host_of(url)), url, html) for url, html in saved_pages(sys.argv[1])]
+
+    checked = differing = 0
+    for extractor, url, html in pages:
+        for parser in parsers:
+            if parser.extract.__module__ != extractor:
+                continue
+            fast, reference = check_parity(parser, html, url)
+            checked += 1
+            if fast != reference:
+                differing += 1
+                print(f"  ✗ {parser.name}: {url}")
+
+    print(f"{checked} page parses checked, {differing} differ")
+    if not checked:
+        print("Nothing was checked")
+        return 1
+    return 1 if differing else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,35 @@
 #!/usr/bin/env python3
 """
 Comprehensive Medical Image Extraction - Master Script
-Coordinates extraction from multiple sources with progress tracking
+Runs every enabled source at the same time, each with its own worker budget
+and host limits, under a global cap on workers and download bandwidth
 """
 import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
-import os
 import json
 import time
-from pathlib import Path
+import threading
+import importlib
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import download_image, sanitize_filename, create_metadata, configure_hosts, limit_bandwidth, BASE_DIR, crawl_state, ImageFilter
+from utils.engine import Source, CrawlEngine, PER_HOST, PARSE_WORKERS
+from utils.wikimedia import fetch_category_images, category_tree, RATE_LIMITS as WIKIMEDIA_RATE_LIMITS
+from wikimedia_api import MAX_CATEGORIES as WIKIMEDIA_MAX_CATEGORIES
+
+# Limits shared by all sources running at once
+MAX_WORKERS = 24                        # blocking calls in flight across sources
+MAX_BANDWIDTH = 8 * 1024 * 1024         # image bytes per second; None for no cap
 
 # Source configurations
 SOURCES = {
     'wikimedia_api': {
         'enabled': True,
         'description': 'Wikimedia Commons via API',
+        'target_width': 1280,
+        'category_depth': 1,
+        'max_categories': WIKIMEDIA_MAX_CATEGORIES,
+        'workers': 12,
         'categories': [
             'Human_anatomy',
             'Anatomical_diagrams', 
@@ -25,49 +37,76 @@ SOURCES = {
             'Human_physiology',
             'Pathology',
             'Microscopic_images_of_human_tissue'
-        ]
+        ],
+        'rate_limits': WIKIMEDIA_RATE_LIMITS,
     },
     'webpath': {
         'enabled': True,
         'description': 'WebPath (University of Utah)',
-        'pages': [
-            'https://webpath.med.utah.edu/GENERAL.html',
-            'https://webpath.med.utah.edu/ORGAN.html',
-            'https://webpath.med.utah.edu/HISTHTML/HISTO.html',
-        ]
+        'module': 'webpath',
+        'workers': 4,
+        'rate_limits': {
+            'webpath.med.utah.edu': {'rate': 1.0, 'burst': 1, 'min_interval': 1.0},
+        }
     },
     'openstax': {
         'enabled': True,
         'description': 'OpenStax Anatomy & Physiology',
-        'url': 'https://openstax.org/books/anatomy-and-physiology-2e/pages/'
+        'module': 'openstax_anatomy',
+        'workers': 4,
+        'rate_limits': {
+            'openstax.org': {'rate': 2.0, 'burst': 2, 'min_interval': 0.5},
+        }
     }
 }
 
 class ExtractionStats:
+    """Totals per source; safe to update from several sources' threads."""
+    
     def __init__(self):
         self.start_time = time.time()
         self.total_found = 0
         self.total_downloaded = 0
         self.total_failed = 0
+        self.total_skipped = 0
+        self.total_filtered = 0
         self.by_source = {}
+        self._lock = threading.Lock()
+    
+    def _add(self, source, key, count=1):
+        with self._lock:
+            setattr(self, f'total_{key}', getattr(self, f'total_{key}') + count)
+            if source not in self.by_source:
+                self.by_source[source] = {'found': 0, 'downloaded': 0, 'failed': 0, 'skipped': 0,
+                                          'filtered': 0, 'filter_hits': {}}
+            self.by_source[source][key] += count
     
     def add_found(self, source, count):
-        self.total_found += count
-        if source not in self.by_source:
-            self.by_source[source] = {'found': 0, 'downloaded': 0, 'failed': 0}
-        self.by_source[source]['found'] += count
+        self._add(source, 'found', count)
     
     def add_downloaded(self, source):
-        self.total_downloaded += 1
-        if source not in self.by_source:
-            self.by_source[source] = {'found': 0, 'downloaded': 0, 'failed': 0}
-        self.by_source[source]['downloaded'] += 1
+        self._add(source, 'downloaded')
     
     def add_failed(self, source):
-        self.total_failed += 1
-        if source not in self.by_source:
-            self.by_source[source] = {'found': 0, 'downloaded': 0, 'failed': 0}
-        self.by_source[source]['failed'] += 1
+        self._add(source, 'failed')
+    
+    def add_skipped(self, source):
+        self._add(source, 'skipped')
+    
+    def add_filtered(self, source, count, hits):
+        """Count the candidates a source's filter dropped, with its rule hits."""
+        self._add(source, 'filtered', count)
+        with self._lock:
+            self.by_source[source]['filter_hits'] = hits
+    
+    def add_outcome(self, source, outcome):
+        """Count one download outcome (True, False, or None when skipped)."""
+        if outcome is True:
+            self.add_downloaded(source)
+        elif outcome is None:
+            self.add_skipped(source)
+        else:
+            self.add_failed(source)
     
     def report(self):
         elapsed = time.time() - self.start_time
@@ -78,48 +117,22 @@ class ExtractionStats:
         print(f"Total found: {self.total_found}")
         print(f"Total downloaded: {self.total_downloaded}")
         print(f"Total failed: {self.total_failed}")
+        print(f"Total skipped: {self.total_skipped}")
+        print(f"Total filtered: {self.total_filtered}")
         print(f"\nBy source:")
         for source, stats in self.by_source.items():
-            print(f"  {source}: {stats['found']} found, {stats['downloaded']} downloaded, {stats['failed']} failed")
+            print(f"  {source}: {stats['found']} found, {stats['downloaded']} downloaded, "
+                  f"{stats['failed']} failed, {stats['skipped']} skipped")
+            if stats['filtered']:
+                print(f"    filtered before fetching: {stats['filtered']} {stats['filter_hits']}")
 
-def extract_wikimedia_category(category, limit=50):
-    """Extract images from a Wikimedia Commons category."""
-    API_URL = "https://commons.wikimedia.org/w/api.php"
-    images = []
-    
-    params = {
-        'action': 'query',
-        'generator': 'categorymembers',
-        'gcmtitle': f'Category:{category}',
-        'gcmtype': 'file',
-        'prop': 'imageinfo',
-        'iiprop': 'url|extmetadata',
-        'format': 'json',
-        'gcmlimit': limit
-    }
-    
-    try:
-        response = rate_limited_request(API_URL, params=params)
-        data = response.json()
-        
-        if 'query' in data and 'pages' in data['query']:
-            for page_id, page_data in data['query']['pages'].items():
-                if 'imageinfo' in page_data:
-                    info = page_data['imageinfo'][0]
-                    metadata = info.get('extmetadata', {})
-                    
-                    images.append({
-                        'url': info.get('url', ''),
-                        'page_url': info.get('descriptionurl', ''),
-                        'title': page_data.get('title', '').replace('File:', ''),
-                        'description': metadata.get('ImageDescription', {}).get('value', '')[:200],
-                        'license': metadata.get('License', {}).get('value', 'CC BY-SA'),
-                        'artist': metadata.get('Artist', {}).get('value', 'Wikimedia Commons')[:100],
-                        'category': category
-                    })
-    except Exception as e:
-        print(f"  Error fetching {category}: {e}")
-    
+def extract_wikimedia_category(category, limit=50, width=None):
+    """Extract images from a Wikimedia Commons category, scaled to width if given."""
+    images = fetch_category_images(category, limit=limit, width=width)
+    for img in images:
+        img['description'] = img['description'][:200]
+        img['license'] = img['license'] or 'CC BY-SA'
+        img['artist'] = (img['artist'] or 'Wikimedia Commons')[:100]
     return images
 
 def categorize_image(title, description, source_type):
@@ -181,11 +194,10 @@ def categorize_image(title, description, source_type):
     
     return 'general'
 
-def download_with_metadata(img_data, source_name, source_type, stats):
+def download_with_metadata(img_data, source_name, source_type):
     """Download a single image with metadata."""
     url = img_data.get('url', '')
     if not url or not url.startswith('http'):
-        stats.add_failed(source_name)
         return False
     
     title = img_data.get('title', '')
@@ -210,39 +222,67 @@ def download_with_metadata(img_data, source_name, source_type, stats):
         attribution=img_data.get('artist', source_name),
         caption=description or title,
         tags=[source_type, category],
-        original_url=url
+        original_url=img_data.get('original_url') or url,
+        width=img_data.get('width'),
+        height=img_data.get('height')
     )
     
     # Download
-    if download_image(url, str(dest_path), metadata):
-        stats.add_downloaded(source_name)
-        return True
-    else:
-        stats.add_failed(source_name)
-        return False
+    return download_image(url, str(dest_path), metadata)
 
-def run_wikimedia_extraction(stats, max_per_category=50):
-    """Run Wikimedia Commons extraction."""
-    print("\n" + "="*60)
-    print("WIKIMEDIA COMMONS EXTRACTION")
-    print("="*60)
+def wikimedia_source(config, max_per_category=50):
+    """Crawl adapter for the Commons categories in config."""
+    def discover():
+        return category_tree(config['categories'], max_depth=config.get('category_depth', 0),
+                             max_categories=config.get('max_categories'))
     
-    categories = SOURCES['wikimedia_api']['categories']
-    all_images = []
+    def extract(category):
+        images = extract_wikimedia_category(category['url'], limit=max_per_category,
+                                            width=config.get('target_width'))
+        print(f"  {category['name']}: found {len(images)} images")
+        return images
     
-    for category in categories:
-        print(f"\nFetching: {category}")
-        images = extract_wikimedia_category(category, limit=max_per_category)
-        print(f"  Found {len(images)} images")
-        all_images.extend(images)
+    def download(img, i):
+        return download_with_metadata(img, 'wiki', 'anatomy')
     
-    stats.add_found('wikimedia_api', len(all_images))
-    
-    print(f"\nDownloading {len(all_images)} images...")
-    for i, img in enumerate(all_images):
-        download_with_metadata(img, 'wiki', 'anatomy', stats)
-        if (i + 1) % 20 == 0:
-            print(f"  Progress: {i+1}/{len(all_images)}")
+    # Files filed under several categories are downloaded and counted once.
+    # The engine filters replayed pages too, so this holds on a resumed run;
+    # the size rules are off since the API reports the originals' sizes.
+    repeats = ImageFilter(skip_patterns=(), tracker_domains=(), min_width=0, min_height=0, max_aspect=None)
+    return Source('master_wikimedia', discover=discover, extract=extract, download=download, per_host=8,
+                  filter=repeats)
+
+def build_source(name, config):
+    """The crawl adapter for a SOURCES entry."""
+    if name == 'wikimedia_api':
+        return wikimedia_source(config)
+    return importlib.import_module(config['module']).SOURCE
+
+def worker_budgets(names, limit=MAX_WORKERS):
+    """Each source's workers, scaled down to fit limit in total."""
+    wanted = {name: SOURCES[name].get('workers', PER_HOST) for name in names}
+    total = sum(wanted.values())
+    if total <= limit:
+        return wanted
+    return {name: max(1, workers * limit // total) for name, workers in wanted.items()}
+
+def parse_budgets(sources, limit=PARSE_WORKERS):
+    """Parse processes per source: the cores shared among sources that parse in a pool."""
+    parsing = [name for name, source in sources.items() if source.fetch and source.parse]
+    share = max(1, limit // max(1, len(parsing)))
+    return {name: share if name in parsing else 0 for name in sources}
+
+def run_source(name, source, workers, parse_workers, stats):
+    """Crawl one source to completion, counting its outcomes in stats."""
+    print(f"\n[{name}] {SOURCES[name]['description']}: {workers} workers")
+    engine = CrawlEngine(max_in_flight=workers, per_host=min(PER_HOST, workers),
+                         parse_workers=parse_workers)
+    result = engine.run(source, sink=lambda img, outcome: stats.add_outcome(name, outcome),
+                        state=crawl_state(source.name))
+    stats.add_found(name, result['found'] - result['filtered'])
+    if source.filter:
+        stats.add_filtered(name, result['filtered'], result['filter_hits'])
+    return result
 
 def main():
     print("="*60)
@@ -250,10 +290,29 @@ def main():
     print("="*60)
     
     stats = ExtractionStats()
+    enabled = [name for name, config in SOURCES.items() if config.get('enabled')]
+    
+    # Adapters are built (and their modules imported) before any job starts,
+    # then each source gets its own per-host politeness limits
+    sources = {name: build_source(name, SOURCES[name]) for name in enabled}
+    for name in enabled:
+        configure_hosts(SOURCES[name].get('rate_limits', {}))
+    limit_bandwidth(MAX_BANDWIDTH)
     
-    # Run Wikimedia extraction
-    if SOURCES['wikimedia_api']['enabled']:
-        run_wikimedia_extraction(stats, max_per_category=50)
+    # All sources run at once; the slowest one sets the total time
+    budgets = worker_budgets(enabled)
+    parse_workers = parse_budgets(sources)
+    with ThreadPoolExecutor(max_workers=max(1, len(enabled))) as pool:
+        jobs = {pool.submit(run_source, name, sources[name], budgets[name], parse_workers[name], stats): name
+                for name in enabled}
+        for job in as_completed(jobs):
+            name = jobs[job]
+            try:
+                result = job.result()
+                print(f"\n[{name}] done: {result['downloaded']} downloaded, {result['failed']} failed, "
+                      f"{result['errors']} errors")
+            except Exception as e:
+                print(f"\n[{name}] failed: {e}")
     
     # Report results
     stats.report()
@@ -267,6 +326,8 @@ def main():
                 'total_found': stats.total_found,
                 'total_downloaded': stats.total_downloaded,
                 'total_failed': stats.total_failed,
+                'total_skipped': stats.total_skipped,
+                'total_filtered': stats.total_filtered,
                 'by_source': stats.by_source
             }
         }, f, indent=2)
@@ -8,19 +8,27 @@ import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
 import re
-import json
-from bs4 import BeautifulSoup
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, configure_hosts, BASE_DIR, fetch_page, ProbeRules
+from utils.engine import Source, run_extractor
+from utils.frontier import Frontier, SeenURLs
+from utils.parsing import PageParser, make_soup
+from utils.filters import ImageFilter
 
 BASE_URL = "http://histology.medicine.umich.edu"
 OUTPUT_DIR = BASE_DIR / "histology"
 LICENSE = "CC BY-NC"
 ATTRIBUTION = "University of Michigan Medical School, Histology and Virtual Microscopy Learning Resources"
 
+# Per-host politeness limits for this source
+RATE_LIMITS = {
+    'histology.medicine.umich.edu': {'rate': 1.0, 'burst': 1, 'min_interval': 1.0},
+}
+configure_hosts(RATE_LIMITS)
+
 def get_main_categories():
     """Get list of main histology categories."""
     response = rate_limited_request(BASE_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = make_soup(response.text, 'a')
     
     categories = []
     # Look for navigation/menu items
@@ -34,23 +42,16 @@ def get_main_categories():
     
     return categories
 
-def extract_slides_from_page(url):
-    """Extract slide images from a category page."""
-    print(f"  Fetching: {url}")
-    response = rate_limited_request(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+def parse_slides(soup, url):
+    """Slide images found on a parsed category page."""
     slides = []
+    seen = SeenURLs()
     
     # Look for image tags with slide-related patterns
     for img in soup.find_all('img'):
         src = img.get('src', '')
         alt = img.get('alt', '')
         
-        # Skip icons and small images
-        if any(x in src.lower() for x in ['icon', 'logo', 'button', 'nav']):
-            continue
-        
         # Look for full-size image links
         parent = img.find_parent('a')
         if parent and parent.get('href'):
@@ -62,10 +63,13 @@ def extract_slides_from_page(url):
             full_url = src if src.startswith('http') else f"{BASE_URL}{src}" if src.startswith('/') else f"{BASE_URL}/{src}"
         
         if full_url and ('.jpg' in full_url.lower() or '.jpeg' in full_url.lower() or '.png' in full_url.lower()):
+            seen.add(full_url)
             slides.append({
                 'url': full_url,
                 'caption': alt,
-                'thumbnail': src
+                'thumbnail': src,
+                'width': img.get('width', ''),
+                'height': img.get('height', '')
             })
     
     # Also look for zoomify or other viewer links
@@ -73,7 +77,7 @@ def extract_slides_from_page(url):
         href = link['href']
         if any(x in href.lower() for x in ['zoomify', 'slide', 'image', 'jpg', 'jpeg']):
             full_url = href if href.startswith('http') else f"{BASE_URL}{href}" if href.startswith('/') else f"{BASE_URL}/{href}"
-            if full_url not in [s['url'] for s in slides]:
+            if seen.add(full_url):
                 slides.append({
                     'url': full_url,
                     'caption': link.get_text(strip=True),
@@ -82,6 +86,14 @@ def extract_slides_from_page(url):
     
     return slides
 
+slide_parser = PageParser(parse_slides, only=['a', 'img'])
+
+def extract_slides_from_page(url):
+    """Extract slide images from a category page."""
+    print(f"  Fetching: {url}")
+    response = rate_limited_request(url)
+    return slide_parser(response.text, url)
+
 def categorize_slide(caption):
     """Determine the category folder based on caption."""
     caption_lower = caption.lower()
@@ -120,95 +132,93 @@ def extract_staining(caption):
             found_stains.append(stain)
     return ', '.join(found_stains) if found_stains else None
 
-def main():
-    print("=" * 60)
-    print("University of Michigan Histology Extractor")
-    print("=" * 60)
-    
-    # Get main page and find slide links
-    print("\n[1] Fetching main page...")
+def discover_slide_pages():
+    """Find all slide-related pages linked from the main page."""
     response = rate_limited_request(BASE_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = make_soup(response.text, 'a')
     
     # Find all links to slide pages
-    slide_links = set()
+    frontier = Frontier()
     for link in soup.find_all('a', href=True):
         href = link['href']
         # Look for slide-related URLs
         if any(pattern in href.lower() for pattern in ['/histology/', 'slide', 'atlas', 'lab']):
             if not href.startswith('http'):
                 href = f"{BASE_URL}{href}" if href.startswith('/') else f"{BASE_URL}/{href}"
-            slide_links.add(href)
+            frontier.add(href)
     
-    print(f"  Found {len(slide_links)} potential slide pages")
+    print(f"  Found {len(frontier)} potential slide pages")
+    return sorted(frontier.drain(), key=lambda page: page['url'])
+
+def parse_page(page, html):
+    """A page's slides tagged with the page."""
+    slides = slide_parser(html, page['url'])
+    for slide in slides:
+        slide['source_page'] = page['url']
+    print(f"  Found {len(slides)} images on {page['url']}")
+    return slides
+
+def extract_page(page):
+    """Extract a page's slides and tag them with the page."""
+    return parse_page(page, fetch_page(page))
+
+def download_one(slide, i):
+    """Download one extracted slide image."""
+    url = slide['url']
+    caption = slide.get('caption', '')
     
-    # Extract slides from each page
-    all_slides = []
-    for i, url in enumerate(sorted(slide_links)):
-        print(f"\n[{i+1}/{len(slide_links)}] Processing: {url}")
-        try:
-            slides = extract_slides_from_page(url)
-            for slide in slides:
-                slide['source_page'] = url
-            all_slides.extend(slides)
-            print(f"  Found {len(slides)} images")
-        except Exception as e:
-            print(f"  Error: {e}")
+    # Determine category
+    category = categorize_slide(caption)
     
-    print(f"\n[2] Total images found: {len(all_slides)}")
+    # Create filename
+    safe_name = sanitize_filename(caption[:50] if caption else f"slide_{i}")
+    ext = url.split('.')[-1].split('?')[0]
+    if ext not in ['jpg', 'jpeg', 'png', 'gif']:
+        ext = 'jpg'
+    filename = f"{safe_name}.{ext}"
+    dest_path = OUTPUT_DIR / category / filename
     
-    # Download images
-    print("\n[3] Downloading images...")
-    downloaded = 0
-    for i, slide in enumerate(all_slides):
-        url = slide['url']
-        caption = slide.get('caption', '')
-        
-        # Determine category
-        category = categorize_slide(caption)
-        
-        # Create filename
-        safe_name = sanitize_filename(caption[:50] if caption else f"slide_{i}")
-        ext = url.split('.')[-1].split('?')[0]
-        if ext not in ['jpg', 'jpeg', 'png', 'gif']:
-            ext = 'jpg'
-        filename = f"{safe_name}.{ext}"
-        dest_path = OUTPUT_DIR / category / filename
-        
-        # Create metadata
-        metadata = create_metadata(
-            source_url=slide.get('source_page', url),
-            license_type=LICENSE,
-            attribution=ATTRIBUTION,
-            caption=caption,
-            tags=['histology', category],
-            magnification=extract_magnification(caption),
-            staining=extract_staining(caption),
-            original_url=url
-        )
-        
-        # Download
-        if download_image(url, str(dest_path), metadata):
-            downloaded += 1
-            print(f"  ✓ {filename}")
-        else:
-            print(f"  ✗ {filename}")
+    # Create metadata
+    metadata = create_metadata(
+        source_url=slide.get('source_page', url),
+        license_type=LICENSE,
+        attribution=ATTRIBUTION,
+        caption=caption,
+        tags=['histology', category],
+        magnification=extract_magnification(caption),
+        staining=extract_staining(caption),
+        original_url=url
+    )
     
-    print(f"\n[4] Downloaded {downloaded}/{len(all_slides)} images")
-    print(f"    Location: {OUTPUT_DIR}")
+    # Download
+    downloaded = download_image(url, str(dest_path), metadata, probe=PROBE_RULES)
+    if downloaded:
+        print(f"  ✓ {filename}")
+        return True
+    if downloaded is None:
+        return None
+    print(f"  ✗ {filename}")
+    return False
+
+# Images the probe rules out before their full transfer
+PROBE_RULES = ProbeRules(min_width=200, min_height=200)
+
+# Junk images dropped before any request is made
+IMAGE_FILTER = ImageFilter()
+
+SOURCE = Source('michigan_histology', discover=discover_slide_pages, extract=extract_page, download=download_one,
+                fetch=fetch_page, parse=parse_page, filter=IMAGE_FILTER)
+
+def main():
+    print("=" * 60)
+    print("University of Michigan Histology Extractor")
+    print("=" * 60)
     
-    # Save index
-    index_path = OUTPUT_DIR / 'michigan_index.json'
-    with open(index_path, 'w') as f:
-        json.dump({
-            'source': 'University of Michigan Histology',
-            'url': BASE_URL,
-            'license': LICENSE,
-            'total_slides': len(all_slides),
-            'downloaded': downloaded,
-            'slides': all_slides
-        }, f, indent=2)
-    print(f"    Index saved: {index_path}")
+    # Discover, extract and download as one streaming pipeline
+    print("\n[1] Crawling slide pages and downloading images...")
+    run_extractor(SOURCE, OUTPUT_DIR / 'michigan_index.json',
+                  key='slides', source='University of Michigan Histology', url=BASE_URL, license=LICENSE)
+    print(f"    Location: {OUTPUT_DIR}")
 
 if __name__ == '__main__':
     main()
@@ -8,10 +8,12 @@ import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
 import re
-import json
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, configure_hosts, BASE_DIR, fetch_page, ProbeRules
+from utils.engine import Source, run_extractor
+from utils.frontier import Frontier, SeenURLs
+from utils.parsing import PageParser, make_soup
+from utils.filters import ImageFilter, SKIP_PATTERNS
 
 BASE_URL = "https://openstax.org"
 BOOK_URL = "https://openstax.org/details/books/anatomy-and-physiology-2e"
@@ -19,13 +21,19 @@ OUTPUT_DIR = BASE_DIR / "anatomy"
 LICENSE = "CC BY"
 ATTRIBUTION = "OpenStax Anatomy and Physiology 2e"
 
+# Per-host politeness limits for this source
+RATE_LIMITS = {
+    'openstax.org': {'rate': 2.0, 'burst': 2, 'min_interval': 0.5},
+}
+configure_hosts(RATE_LIMITS)
+
 def get_chapter_links():
     """Get all chapter links from the book page."""
     print(f"  Fetching book page: {BOOK_URL}")
     response = rate_limited_request(BOOK_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = make_soup(response.text, 'a')
     
-    chapters = []
+    frontier = Frontier()
     
     # Look for chapter links
     for link in soup.find_all('a', href=True):
@@ -35,7 +43,7 @@ def get_chapter_links():
         # OpenStax anatomy book chapter links typically contain 'anatomy-and-physiology'
         if 'anatomy-and-physiology' in href and ('pages' in href or 'chapter' in href):
             full_url = urljoin(BASE_URL, href)
-            chapters.append({'name': text, 'url': full_url})
+            frontier.add(full_url, name=text)
     
     # Also try to find TOC
     toc_links = soup.find_all('a', href=re.compile(r'(/contents/|/pages/)'))
@@ -44,17 +52,14 @@ def get_chapter_links():
         text = link.get_text(strip=True)
         if text and len(text) > 3:
             full_url = urljoin(BASE_URL, href)
-            if full_url not in [c['url'] for c in chapters]:
-                chapters.append({'name': text, 'url': full_url})
+            frontier.add(full_url, name=text)
     
-    return chapters
+    return list(frontier.drain())
 
-def extract_images_from_page(url):
-    """Extract images from an OpenStax page."""
-    response = rate_limited_request(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+def parse_page_images(soup, url):
+    """Images found on a parsed OpenStax page."""
     images = []
+    seen = SeenURLs()
     
     # OpenStax images are typically in figure tags
     for figure in soup.find_all('figure'):
@@ -81,11 +86,14 @@ def extract_images_from_page(url):
             if title_elem:
                 figure_num = title_elem.get_text(strip=True)
             
+            seen.add(src)
             images.append({
                 'url': src,
                 'alt': alt,
                 'caption': caption,
-                'figure_number': figure_num
+                'figure_number': figure_num,
+                'width': img.get('width', ''),
+                'height': img.get('height', '')
             })
     
     # Also look for standalone images
@@ -93,10 +101,6 @@ def extract_images_from_page(url):
         src = img.get('data-src') or img.get('src', '')
         alt = img.get('alt', '')
         
-        # Skip small icons and logos
-        if any(x in src.lower() for x in ['logo', 'icon', 'button', 'avatar']):
-            continue
-        
         if src:
             if src.startswith('//'):
                 src = 'https:' + src
@@ -104,16 +108,25 @@ def extract_images_from_page(url):
                 src = urljoin(BASE_URL, src)
             
             # Check if we already have this image
-            if not any(i['url'] == src for i in images):
+            if seen.add(src):
                 images.append({
                     'url': src,
                     'alt': alt,
                     'caption': '',
-                    'figure_number': ''
+                    'figure_number': '',
+                    'width': img.get('width', ''),
+                    'height': img.get('height', '')
                 })
     
     return images
 
+page_parser = PageParser(parse_page_images, only=['figure', 'img'])
+
+def extract_images_from_page(url):
+    """Extract images from an OpenStax page."""
+    response = rate_limited_request(url)
+    return page_parser(response.text, url)
+
 def categorize_anatomy(caption, alt):
     """Determine anatomy category."""
     text = (caption + ' ' + alt).lower()
@@ -141,91 +154,89 @@ def categorize_anatomy(caption, alt):
     else:
         return 'general'
 
-def main():
-    print("=" * 60)
-    print("OpenStax Anatomy & Physiology Extractor")
-    print("=" * 60)
-    
-    # Get chapter links
-    print("\n[1] Discovering chapters...")
+def discover():
+    """Chapter pages to crawl."""
     chapters = get_chapter_links()
     print(f"  Found {len(chapters)} chapters")
+    return chapters[:30]  # Limit chapters
+
+def parse_chapter(chapter, html):
+    """A chapter's images tagged with the chapter."""
+    print(f"  {chapter['name'][:50]}")
+    images = page_parser(html, chapter['url'])
+    for img in images:
+        img['chapter'] = chapter['name']
+        img['chapter_url'] = chapter['url']
+    return images
+
+def extract_chapter(chapter):
+    """Extract a chapter's images and tag them with the chapter."""
+    return parse_chapter(chapter, fetch_page(chapter))
+
+def download_one(img, i):
+    """Download one extracted image; returns None when it is skipped."""
+    url = img['url']
+    caption = img.get('caption', '')
+    alt = img.get('alt', '')
     
-    # Extract images from each chapter
-    print("\n[2] Extracting images...")
-    all_images = []
-    for i, chapter in enumerate(chapters[:30]):  # Limit chapters
-        print(f"  [{i+1}/{min(len(chapters), 30)}] {chapter['name'][:50]}")
-        try:
-            images = extract_images_from_page(chapter['url'])
-            for img in images:
-                img['chapter'] = chapter['name']
-                img['chapter_url'] = chapter['url']
-            all_images.extend(images)
-        except Exception as e:
-            print(f"    Error: {e}")
+    # Skip non-image URLs
+    if not url.startswith('http'):
+        return None
     
-    print(f"\n  Total images found: {len(all_images)}")
+    # Determine category
+    category = categorize_anatomy(caption, alt)
     
-    # Download images
-    print("\n[3] Downloading images...")
-    downloaded = 0
-    for i, img in enumerate(all_images):
-        url = img['url']
-        caption = img.get('caption', '')
-        alt = img.get('alt', '')
-        
-        # Skip non-image URLs
-        if not url.startswith('http'):
-            continue
-        
-        # Determine category
-        category = categorize_anatomy(caption, alt)
-        
-        # Create filename
-        safe_name = sanitize_filename((img.get('figure_number', '') + '_' + caption[:30]) if caption else alt[:40] if alt else f"openstax_{i}")
-        ext = 'jpg'
-        if '.' in url.split('/')[-1]:
-            ext_candidate = url.split('.')[-1].split('?')[0]
-            if ext_candidate in ['jpg', 'jpeg', 'png', 'gif', 'svg']:
-                ext = ext_candidate
-        filename = f"openstax_{safe_name}.{ext}"
-        dest_path = OUTPUT_DIR / category / filename
-        
-        # Create metadata
-        metadata = create_metadata(
-            source_url=img.get('chapter_url', url),
-            license_type=LICENSE,
-            attribution=ATTRIBUTION,
-            caption=caption or alt,
-            tags=['anatomy', category],
-            chapter=img.get('chapter', ''),
-            figure_number=img.get('figure_number', ''),
-            original_url=url
-        )
-        
-        # Download
-        if download_image(url, str(dest_path), metadata):
-            downloaded += 1
-            print(f"    ✓ {filename}")
-        else:
-            print(f"    ✗ {filename}")
+    # Create filename
+    safe_name = sanitize_filename((img.get('figure_number', '') + '_' + caption[:30]) if caption else alt[:40] if alt else f"openstax_{i}")
+    ext = 'jpg'
+    if '.' in url.split('/')[-1]:
+        ext_candidate = url.split('.')[-1].split('?')[0]
+        if ext_candidate in ['jpg', 'jpeg', 'png', 'gif', 'svg']:
+            ext = ext_candidate
+    filename = f"openstax_{safe_name}.{ext}"
+    dest_path = OUTPUT_DIR / category / filename
     
-    print(f"\n[4] Downloaded {downloaded}/{len(all_images)} images")
-    print(f"    Location: {OUTPUT_DIR}")
+    # Create metadata
+    metadata = create_metadata(
+        source_url=img.get('chapter_url', url),
+        license_type=LICENSE,
+        attribution=ATTRIBUTION,
+        caption=caption or alt,
+        tags=['anatomy', category],
+        chapter=img.get('chapter', ''),
+        figure_number=img.get('figure_number', ''),
+        original_url=url
+    )
+    
+    # Download
+    downloaded = download_image(url, str(dest_path), metadata, probe=PROBE_RULES)
+    if downloaded:
+        print(f"    ✓ {filename}")
+        return True
+    if downloaded is None:
+        return None
+    print(f"    ✗ {filename}")
+    return False
+
+# Images the probe rules out before their full transfer
+PROBE_RULES = ProbeRules()
+
+# Junk images dropped before any request is made
+IMAGE_FILTER = ImageFilter(skip_patterns=SKIP_PATTERNS + ['avatar'])
+
+SOURCE = Source('openstax', discover=discover, extract=extract_chapter, download=download_one,
+                fetch=fetch_page, parse=parse_chapter, filter=IMAGE_FILTER)
+
+def main():
+    print("=" * 60)
+    print("OpenStax Anatomy & Physiology Extractor")
+    print("=" * 60)
     
-    # Save index
-    index_path = OUTPUT_DIR / 'openstax_index.json'
-    with open(index_path, 'w') as f:
-        json.dump({
-            'source': 'OpenStax Anatomy and Physiology 2e',
-            'url': BOOK_URL,
-            'license': LICENSE,
-            'total_images': len(all_images),
-            'downloaded': downloaded,
-            'images': all_images
-        }, f, indent=2)
-    print(f"    Index saved: {index_path}")
+    # Discover, extract and download as one streaming pipeline
+    print("\n[1] Crawling chapters and downloading images...")
+    run_extractor(SOURCE, OUTPUT_DIR / 'openstax_index.json',
+                  source='OpenStax Anatomy and Physiology 2e', url=BOOK_URL, license=LICENSE)
+    print(f"    Location: {OUTPUT_DIR}")
 
 if __name__ == '__main__':
     main()
@@ -7,17 +7,25 @@ License: CC BY (with attribution)
 import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
-import re
-import json
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, configure_hosts, BASE_DIR, fetch_page, ProbeRules
+from utils.engine import Source, run_extractor
+from utils.frontier import Frontier
+from utils.parsing import PageParser, make_soup
+from utils.captions import DocumentIndex
+from utils.filters import ImageFilter
 
 BASE_URL = "https://www.pathologyoutlines.com"
 OUTPUT_DIR = BASE_DIR / "pathology"
 LICENSE = "CC BY"
 ATTRIBUTION = "PathologyOutlines.com, Inc."
 
+# Per-host politeness limits for this source
+RATE_LIMITS = {
+    'www.pathologyoutlines.com': {'rate': 1.0, 'burst': 1, 'min_interval': 1.0},
+}
+configure_hosts(RATE_LIMITS)
+
 # Known major sections in Pathology Outlines
 SECTIONS = [
     '/topic/',  # Main topics
@@ -27,9 +35,9 @@ def discover_topics():
     """Discover pathology topics from the main page."""
     print(f"  Fetching main page: {BASE_URL}")
     response = rate_limited_request(BASE_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = make_soup(response.text, 'a')
     
-    topics = []
+    frontier = Frontier()
     
     # Find all topic links
     for link in soup.find_all('a', href=True):
@@ -39,16 +47,13 @@ def discover_topics():
         # Look for topic pages
         if '/topic/' in href or '/page/' in href:
             full_url = urljoin(BASE_URL, href)
-            if full_url not in [t['url'] for t in topics]:
-                topics.append({'name': text, 'url': full_url})
+            frontier.add(full_url, name=text)
     
-    return topics
+    return list(frontier.drain())
 
-def extract_images_from_topic_page(url):
-    """Extract images from a pathology topic page."""
-    response = rate_limited_request(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+def parse_topic_page(soup, url):
+    """Images found on a parsed topic page."""
+    doc = DocumentIndex(soup)
     images = []
     
     # PathologyOutlines images are often in figures or with specific classes
@@ -56,10 +61,6 @@ def extract_images_from_topic_page(url):
         src = img.get('src', '')
         alt = img.get('alt', '')
         
-        # Skip navigation and icons
-        if any(x in src.lower() for x in ['icon', 'logo', 'button', 'nav', 'spacer', 'banner']):
-            continue
-        
         # Get full URL
         full_url = urljoin(url, src)
         
@@ -76,27 +77,37 @@ def extract_images_from_topic_page(url):
             # Look for figure caption
             figure = img.find_parent('figure')
             if figure:
-                figcaption = figure.find('figcaption')
+                figcaption = doc.first_within(figure, 'figcaption')
                 if figcaption:
-                    caption = figcaption.get_text(strip=True)
+                    caption = doc.text(figcaption)
         
         # Look for case/diagnosis info in nearby text
         diagnosis = ''
-        for elem in img.find_all_next(['p', 'div', 'span'], limit=3):
-            text = elem.get_text(strip=True)
+        for elem in doc.next(img, ['p', 'div', 'span'], limit=3):
+            text = doc.text(elem)
             if text and len(text) < 500:
                 diagnosis = text
                 break
         
         images.append({
             'url': full_url,
+            'thumbnail': src,
             'alt': alt,
             'caption': caption,
-            'diagnosis_info': diagnosis[:200]
+            'diagnosis_info': diagnosis[:200],
+            'width': img.get('width', ''),
+            'height': img.get('height', '')
         })
     
     return images
 
+topic_parser = PageParser(parse_topic_page)
+
+def extract_images_from_topic_page(url):
+    """Extract images from a pathology topic page."""
+    response = rate_limited_request(url)
+    return topic_parser(response.text, url)
+
 def categorize_pathology(url, caption, alt):
     """Determine pathology category from URL and text."""
     text = (url + ' ' + caption + ' ' + alt).lower()
@@ -126,95 +137,91 @@ def categorize_pathology(url, caption, alt):
     else:
         return 'general'
 
-def main():
-    print("=" * 60)
-    print("Pathology Outlines Extractor")
-    print("=" * 60)
-    
-    # Discover topics
-    print("\n[1] Discovering topics...")
+def discover():
+    """Topic pages to crawl."""
     topics = discover_topics()
     print(f"  Found {len(topics)} topics")
     
     # Limit topics for initial run
-    topics = topics[:100]
+    return topics[:100]
+
+def parse_topic(topic, html):
+    """A topic page's images tagged with the topic."""
+    images = topic_parser(html, topic['url'])
+    for img in images:
+        img['topic'] = topic['name']
+        img['topic_url'] = topic['url']
+    if images:
+        print(f"    {topic['name'][:50]}: found {len(images)} images")
+    return images
+
+def extract_topic(topic):
+    """Extract a topic page's images and tag them with the topic."""
+    return parse_topic(topic, fetch_page(topic))
+
+def download_one(img, i):
+    """Download one extracted image; returns None when it is skipped."""
+    url = img['url']
+    caption = img.get('caption', '')
+    alt = img.get('alt', '')
+    topic = img.get('topic', '')
     
-    # Extract images from each topic
-    print("\n[2] Extracting images...")
-    all_images = []
-    for i, topic in enumerate(topics):
-        print(f"  [{i+1}/{len(topics)}] {topic['name'][:50]}")
-        try:
-            images = extract_images_from_topic_page(topic['url'])
-            for img in images:
-                img['topic'] = topic['name']
-                img['topic_url'] = topic['url']
-            all_images.extend(images)
-            if images:
-                print(f"    Found {len(images)} images")
-        except Exception as e:
-            print(f"    Error: {e}")
+    # Skip non-image URLs
+    if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
+        return None
     
-    print(f"\n  Total images found: {len(all_images)}")
+    # Determine category
+    category = categorize_pathology(img.get('topic_url', ''), caption, alt)
     
-    # Download images
-    print("\n[3] Downloading images...")
-    downloaded = 0
-    for i, img in enumerate(all_images):
-        url = img['url']
-        caption = img.get('caption', '')
-        alt = img.get('alt', '')
-        topic = img.get('topic', '')
-        
-        # Skip non-image URLs
-        if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
-            continue
-        
-        # Determine category
-        category = categorize_pathology(img.get('topic_url', ''), caption, alt)
-        
-        # Create filename
-        safe_name = sanitize_filename((topic[:20] + '_' + caption[:30]) if caption else alt[:40] if alt else f"po_{i}")
-        ext = url.split('.')[-1].split('?')[0]
-        if ext not in ['jpg', 'jpeg', 'png', 'gif']:
-            ext = 'jpg'
-        filename = f"po_{safe_name}.{ext}"
-        dest_path = OUTPUT_DIR / category / filename
-        
-        # Create metadata
-        metadata = create_metadata(
-            source_url=img.get('topic_url', url),
-            license_type=LICENSE,
-            attribution=ATTRIBUTION,
-            caption=caption or alt,
-            tags=['pathology', category],
-            topic=topic,
-            diagnosis_info=img.get('diagnosis_info', ''),
-            original_url=url
-        )
-        
-        # Download
-        if download_image(url, str(dest_path), metadata):
-            downloaded += 1
-            print(f"    ✓ {filename}")
-        else:
-            print(f"    ✗ {filename}")
+    # Create filename
+    safe_name = sanitize_filename((topic[:20] + '_' + caption[:30]) if caption else alt[:40] if alt else f"po_{i}")
+    ext = url.split('.')[-1].split('?')[0]
+    if ext not in ['jpg', 'jpeg', 'png', 'gif']:
+        ext = 'jpg'
+    filename = f"po_{safe_name}.{ext}"
+    dest_path = OUTPUT_DIR / category / filename
     
-    print(f"\n[4] Downloaded {downloaded}/{len(all_images)} images")
-    print(f"    Location: {OUTPUT_DIR}")
+    # Create metadata
+    metadata = create_metadata(
+        source_url=img.get('topic_url', url),
+        license_type=LICENSE,
+        attribution=ATTRIBUTION,
+        caption=caption or alt,
+        tags=['pathology', category],
+        topic=topic,
+        diagnosis_info=img.get('diagnosis_info', ''),
+        original_url=url
+    )
+    
+    # Download
+    downloaded = download_image(url, str(dest_path), metadata, probe=PROBE_RULES)
+    if downloaded:
+        print(f"    ✓ {filename}")
+        return True
+    if downloaded is None:
+        return None
+    print(f"    ✗ {filename}")
+    return False
+
+# Images the probe rules out before their full transfer
+PROBE_RULES = ProbeRules(min_width=150, min_height=150)
+
+# Junk images dropped before any request is made
+IMAGE_FILTER = ImageFilter()
+
+SOURCE = Source('pathology_outlines', discover=discover, extract=extract_topic, download=download_one,
+                fetch=fetch_page, parse=parse_topic, filter=IMAGE_FILTER)
+
+def main():
+    print("=" * 60)
+    print("Pathology Outlines Extractor")
+    print("=" * 60)
     
-    # Save index
-    index_path = OUTPUT_DIR / 'pathology_outlines_index.json'
-    with open(index_path, 'w') as f:
-        json.dump({
-            'source': 'Pathology Outlines',
-            'url': BASE_URL,
-            'license': LICENSE,
-            'total_images': len(all_images),
-            'downloaded': downloaded,
-            'images': all_images
-        }, f, indent=2)
-    print(f"    Index saved: {index_path}")
+    # Discover, extract and download as one streaming pipeline
+    print("\n[1] Crawling topics and downloading images...")
+    run_extractor(SOURCE, OUTPUT_DIR / 'pathology_outlines_index.json',
+                  source='Pathology Outlines', url=BASE_URL, license=LICENSE)
+    print(f"    Location: {OUTPUT_DIR}")
 
 if __name__ == '__main__':
     main()
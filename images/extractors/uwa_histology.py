@@ -8,22 +8,31 @@ import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
 import re
-import json
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, configure_hosts, BASE_DIR, fetch_page, ProbeRules
+from utils.engine import Source, run_extractor
+from utils.frontier import Frontier
+from utils.parsing import PageParser, make_soup
+from utils.captions import DocumentIndex
+from utils.filters import ImageFilter
 
 BASE_URL = "https://www.lab.anhb.uwa.edu.au/teaching/physiology/"
 OUTPUT_DIR = BASE_DIR / "histology"
 LICENSE = "Educational Use"
 ATTRIBUTION = "University of Western Australia, School of Human Sciences - Blue Histology"
 
+# Per-host politeness limits for this source
+RATE_LIMITS = {
+    'www.lab.anhb.uwa.edu.au': {'rate': 1.0, 'burst': 1, 'min_interval': 1.0},
+}
+configure_hosts(RATE_LIMITS)
+
 def get_lab_pages():
-    """Get list of all lab/topic pages."""
+    """Frontier of the lab/topic pages linked from the index."""
     response = rate_limited_request(BASE_URL)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = make_soup(response.text, 'a')
     
-    pages = []
+    frontier = Frontier()
     for link in soup.find_all('a', href=True):
         href = link['href']
         text = link.get_text(strip=True)
@@ -32,16 +41,13 @@ def get_lab_pages():
         if any(x in href.lower() for x in ['histology', 'lab', 'topic', 'guide']):
             if href.endswith('.html') or href.endswith('.htm'):
                 full_url = urljoin(BASE_URL, href)
-                pages.append({'name': text, 'url': full_url})
+                frontier.add(full_url, name=text)
     
-    return pages
+    return frontier
 
-def extract_images_from_page(url):
-    """Extract images from a lab page."""
-    print(f"  Fetching: {url}")
-    response = rate_limited_request(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+def parse_lab_page(soup, url):
+    """Images found on a parsed lab page."""
+    doc = DocumentIndex(soup)
     images = []
     
     # Find all images
@@ -49,10 +55,6 @@ def extract_images_from_page(url):
         src = img.get('src', '')
         alt = img.get('alt', '')
         
-        # Skip navigation and small images
-        if any(x in src.lower() for x in ['icon', 'logo', 'button', 'nav', 'bullet']):
-            continue
-        
         # Get full URL
         full_url = urljoin(url, src)
         
@@ -69,25 +71,35 @@ def extract_images_from_page(url):
             # Try to find caption in figure or nearby text
             parent_fig = img.find_parent(['figure', 'td', 'div'])
             if parent_fig:
-                caption_elem = parent_fig.find(['figcaption', 'caption', 'b', 'strong'])
+                caption_elem = doc.first_within(parent_fig, ['figcaption', 'caption', 'b', 'strong'])
                 if caption_elem:
-                    caption = caption_elem.get_text(strip=True)
+                    caption = doc.text(caption_elem)
         
         # Try to get more context from surrounding text
         if not caption:
             next_sibling = img.find_next_sibling()
             if next_sibling:
-                caption = next_sibling.get_text(strip=True)[:100]
+                caption = doc.text(next_sibling)[:100]
         
         images.append({
             'url': full_url,
             'caption': caption,
             'alt': alt,
-            'thumbnail': src
+            'thumbnail': src,
+            'width': img.get('width', ''),
+            'height': img.get('height', '')
         })
     
     return images
 
+lab_parser = PageParser(parse_lab_page)
+
+def extract_images_from_page(url):
+    """Extract images from a lab page."""
+    print(f"  Fetching: {url}")
+    response = rate_limited_request(url)
+    return lab_parser(response.text, url)
+
 def categorize_image(caption, alt, page_name):
     """Determine tissue category."""
     text = (caption + ' ' + alt + ' ' + page_name).lower()
@@ -135,106 +147,102 @@ def extract_staining(caption):
             found.append(stain)
     return ', '.join(found) if found else None
 
-def main():
-    print("=" * 60)
-    print("UWA Blue Histology Extractor")
-    print("=" * 60)
+# Known Blue Histology pages not always linked from the index
+KNOWN_PAGES = [
+    'epithelium.html', 'connective.html', 'blood.html', 'muscle.html',
+    'nerve.html', 'cardio.html', 'respiratory.html', 'lymphoid.html',
+    'endocrine.html', 'skin.html', 'git.html', 'liver.html',
+    'urinary.html', 'female.html', 'male.html', 'sense.html',
+    'eye.html', 'bone.html', 'tissue.html'
+]
+
+def discover():
+    """Lab pages to crawl, including the known Blue Histology pages."""
+    frontier = get_lab_pages()
+    print(f"  Found {len(frontier)} pages")
     
-    # Get lab pages
-    print("\n[1] Discovering lab pages...")
-    pages = get_lab_pages()
-    print(f"  Found {len(pages)} pages")
+    for page in KNOWN_PAGES:
+        frontier.add(urljoin(BASE_URL, page), name=page.replace('.html', '').title())
     
-    # Also add known Blue Histology pages
-    known_pages = [
-        'epithelium.html', 'connective.html', 'blood.html', 'muscle.html',
-        'nerve.html', 'cardio.html', 'respiratory.html', 'lymphoid.html',
-        'endocrine.html', 'skin.html', 'git.html', 'liver.html',
-        'urinary.html', 'female.html', 'male.html', 'sense.html',
-        'eye.html', 'bone.html', 'tissue.html'
-    ]
+    print(f"  Total pages to scan: {len(frontier)}")
+    return list(frontier.drain())
+
+def parse_page(page, html):
+    """A lab page's images tagged with the page."""
+    images = lab_parser(html, page['url'])
+    for img in images:
+        img['page_name'] = page['name']
+        img['page_url'] = page['url']
+    print(f"  {page['name']}: found {len(images)} images")
+    return images
+
+def extract_page(page):
+    """Extract a lab page's images and tag them with the page."""
+    return parse_page(page, fetch_page(page))
+
+def download_one(img, i):
+    """Download one extracted image; returns None when it is skipped."""
+    url = img['url']
+    caption = img.get('caption', '') or img.get('alt', '')
+    page_name = img.get('page_name', '')
     
-    for page in known_pages:
-        url = urljoin(BASE_URL, page)
-        if not any(p['url'] == url for p in pages):
-            pages.append({'name': page.replace('.html', '').title(), 'url': url})
+    # Skip non-image URLs
+    if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
+        return None
     
-    print(f"  Total pages to scan: {len(pages)}")
+    # Determine category
+    category = categorize_image(caption, img.get('alt', ''), page_name)
     
-    # Extract images from each page
-    all_images = []
-    for i, page in enumerate(pages):
-        print(f"\n[{i+1}/{len(pages)}] Processing: {page['name']}")
-        try:
-            images = extract_images_from_page(page['url'])
-            for img in images:
-                img['page_name'] = page['name']
-                img['page_url'] = page['url']
-            all_images.extend(images)
-            print(f"  Found {len(images)} images")
-        except Exception as e:
-            print(f"  Error: {e}")
+    # Create filename
+    safe_name = sanitize_filename((page_name + '_' + caption[:40]) if caption else f"uwa_{i}")
+    ext = url.split('.')[-1].split('?')[0]
+    if ext not in ['jpg', 'jpeg', 'png', 'gif']:
+        ext = 'jpg'
+    filename = f"uwa_{safe_name}.{ext}"
+    dest_path = OUTPUT_DIR / category / filename
     
-    print(f"\n[2] Total images found: {len(all_images)}")
+    # Create metadata
+    metadata = create_metadata(
+        source_url=img.get('page_url', url),
+        license_type=LICENSE,
+        attribution=ATTRIBUTION,
+        caption=caption,
+        tags=['histology', 'blue-histology', category, page_name.lower()],
+        magnification=extract_magnification(caption),
+        staining=extract_staining(caption),
+        page=page_name,
+        original_url=url
+    )
     
-    # Download images
-    print("\n[3] Downloading images...")
-    downloaded = 0
-    for i, img in enumerate(all_images):
-        url = img['url']
-        caption = img.get('caption', '') or img.get('alt', '')
-        page_name = img.get('page_name', '')
-        
-        # Skip non-image URLs
-        if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
-            continue
-        
-        # Determine category
-        category = categorize_image(caption, img.get('alt', ''), page_name)
-        
-        # Create filename
-        safe_name = sanitize_filename((page_name + '_' + caption[:40]) if caption else f"uwa_{i}")
-        ext = url.split('.')[-1].split('?')[0]
-        if ext not in ['jpg', 'jpeg', 'png', 'gif']:
-            ext = 'jpg'
-        filename = f"uwa_{safe_name}.{ext}"
-        dest_path = OUTPUT_DIR / category / filename
-        
-        # Create metadata
-        metadata = create_metadata(
-            source_url=img.get('page_url', url),
-            license_type=LICENSE,
-            attribution=ATTRIBUTION,
-            caption=caption,
-            tags=['histology', 'blue-histology', category, page_name.lower()],
-            magnification=extract_magnification(caption),
-            staining=extract_staining(caption),
-            page=page_name,
-            original_url=url
-        )
-        
-        # Download
-        if download_image(url, str(dest_path), metadata):
-            downloaded += 1
-            print(f"  ✓ {filename}")
-        else:
-            print(f"  ✗ {filename}")
+    # Download
+    downloaded = download_image(url, str(dest_path), metadata, probe=PROBE_RULES)
+    if downloaded:
+        print(f"  ✓ {filename}")
+        return True
+    if downloaded is None:
+        return None
+    print(f"  ✗ {filename}")
+    return False
+
+# Images the probe rules out before their full transfer
+PROBE_RULES = ProbeRules(min_width=150, min_height=150)
+
+# Junk images dropped before any request is made
+IMAGE_FILTER = ImageFilter()
+
+SOURCE = Source('uwa_histology', discover=discover, extract=extract_page, download=download_one,
+                fetch=fetch_page, parse=parse_page, filter=IMAGE_FILTER)
+
+def main():
+    print("=" * 60)
+    print("UWA Blue Histology Extractor")
+    print("=" * 60)
     
-    print(f"\n[4] Downloaded {downloaded}/{len(all_images)} images")
+    # Discover, extract and download as one streaming pipeline
+    print("\n[1] Crawling lab pages and downloading images...")
+    run_extractor(SOURCE, OUTPUT_DIR / 'uwa_index.json',
+                  source='UWA Blue Histology', url=BASE_URL, license=LICENSE)
     print(f"    Location: {OUTPUT_DIR}")
-    
-    # Save index
-    index_path = OUTPUT_DIR / 'uwa_index.json'
-    with open(index_path, 'w') as f:
-        json.dump({
-            'source': 'UWA Blue Histology',
-            'url': BASE_URL,
-            'license': LICENSE,
-            'total_images': len(all_images),
-            'downloaded': downloaded,
-            'images': all_images
-        }, f, indent=2)
-    print(f"    Index saved: {index_path}")
 
 if __name__ == '__main__':
     main()
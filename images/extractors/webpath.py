@@ -7,17 +7,26 @@ License: Educational use (requires attribution)
 import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
-import re
-import json
-from bs4 import BeautifulSoup
+from itertools import islice
 from urllib.parse import urljoin
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, configure_hosts, BASE_DIR, fetch_page, ProbeRules
+from utils.engine import Source, run_extractor
+from utils.frontier import SeenURLs
+from utils.parsing import PageParser, make_soup
+from utils.captions import DocumentIndex
+from utils.filters import ImageFilter
 
 BASE_URL = "https://webpath.med.utah.edu"
 OUTPUT_DIR = BASE_DIR / "pathology"
 LICENSE = "Educational Use - Attribution Required"
 ATTRIBUTION = "WebPath®, Mercer University School of Medicine, Savannah, Georgia"
 
+# Per-host politeness limits for this source
+RATE_LIMITS = {
+    'webpath.med.utah.edu': {'rate': 1.0, 'burst': 1, 'min_interval': 1.0},
+}
+configure_hosts(RATE_LIMITS)
+
 # Known WebPath sections
 WEBPATH_SECTIONS = [
     '/ curriculum.html',
@@ -36,49 +45,43 @@ WEBPATH_SECTIONS = [
 ]
 
 def discover_pages():
-    """Discover all case and image pages."""
-    all_pages = []
-    
+    """Yield case and image pages as each section is scanned."""
+    seen = SeenURLs()
     for section in WEBPATH_SECTIONS:
         url = urljoin(BASE_URL, section)
         print(f"  Scanning: {url}")
         try:
             response = rate_limited_request(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all links to case pages
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                text = link.get_text(strip=True)
-                
-                # Look for case/image pages
-                if any(x in href.lower() for x in ['.html', '.htm', 'case', 'image']):
-                    full_url = urljoin(url, href)
-                    all_pages.append({
-                        'name': text,
-                        'url': full_url,
-                        'section': section.split('/')[-1].replace('TOC.html', '').replace('.html', '')
-                    })
+            soup = make_soup(response.text, 'a')
         except Exception as e:
             print(f"    Error scanning {url}: {e}")
-    
-    return all_pages
+            continue
+        
+        # Find all links to case pages
+        for link in soup.find_all('a', href=True):
+            href = link['href']
+            text = link.get_text(strip=True)
+            
+            # Look for case/image pages
+            if any(x in href.lower() for x in ['.html', '.htm', 'case', 'image']):
+                full_url = urljoin(url, href)
+                if not seen.add(full_url):
+                    continue
+                yield {
+                    'name': text,
+                    'url': full_url,
+                    'section': section.split('/')[-1].replace('TOC.html', '').replace('.html', '')
+                }
 
-def extract_images_from_page(url):
-    """Extract images from a WebPath page."""
-    response = rate_limited_request(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+def parse_page_images(soup, url):
+    """Images found on a parsed WebPath page."""
+    doc = DocumentIndex(soup)
     images = []
     
     for img in soup.find_all('img'):
         src = img.get('src', '')
         alt = img.get('alt', '')
         
-        # Skip navigation and small icons
-        if any(x in src.lower() for x in ['icon', 'logo', 'button', 'nav', 'bullet', 'spacer']):
-            continue
-        
         # Get full URL
         full_url = urljoin(url, src)
         
@@ -95,27 +98,37 @@ def extract_images_from_page(url):
             # Look for figure caption
             fig = img.find_parent('figure') or img.find_parent('center') or img.find_parent('p')
             if fig:
-                caption_elem = fig.find_next_sibling() or fig.find('figcaption')
+                caption_elem = fig.find_next_sibling() or doc.first_within(fig, 'figcaption')
                 if caption_elem:
-                    caption = caption_elem.get_text(strip=True)
+                    caption = doc.text(caption_elem)
         
         # Get context from page text
         if not caption:
             # Look for nearby bold/strong text
-            for elem in img.find_all_previous(['b', 'strong', 'h1', 'h2', 'h3'], limit=3):
-                text = elem.get_text(strip=True)
+            for elem in doc.previous(img, ['b', 'strong', 'h1', 'h2', 'h3'], limit=3):
+                text = doc.text(elem)
                 if text and len(text) < 200:
                     caption = text
                     break
         
         images.append({
             'url': full_url,
+            'thumbnail': src,
             'caption': caption[:200] if caption else '',
-            'alt': alt
+            'alt': alt,
+            'width': img.get('width', ''),
+            'height': img.get('height', '')
         })
     
     return images
 
+page_parser = PageParser(parse_page_images)
+
+def extract_images_from_page(url):
+    """Extract images from a WebPath page."""
+    response = rate_limited_request(url)
+    return page_parser(response.text, url)
+
 def categorize_pathology(caption, section):
     """Determine pathology category."""
     text = (caption + ' ' + section).lower()
@@ -145,87 +158,85 @@ def categorize_pathology(caption, section):
     else:
         return 'general'
 
-def main():
-    print("=" * 60)
-    print("WebPath (University of Utah) Extractor")
-    print("=" * 60)
+def discover():
+    """Case pages to crawl."""
+    # Limit to first 50 pages initially
+    return islice(discover_pages(), 50)
+
+def parse_page(page, html):
+    """A page's images tagged with the page and section."""
+    print(f"  {page['name'][:50]}")
+    images = page_parser(html, page['url'])
+    for img in images:
+        img['page_name'] = page['name']
+        img['page_url'] = page['url']
+        img['section'] = page['section']
+    return images
+
+def extract_page(page):
+    """Extract a page's images and tag them with the page and section."""
+    return parse_page(page, fetch_page(page))
+
+def download_one(img, i):
+    """Download one extracted image; returns None when it is skipped."""
+    url = img['url']
+    caption = img.get('caption', '')
+    section = img.get('section', '')
     
-    # Discover pages
-    print("\n[1] Discovering pages...")
-    pages = discover_pages()
-    print(f"  Found {len(pages)} pages")
+    # Skip non-images
+    if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
+        return None
     
-    # Extract images from each page
-    print("\n[2] Extracting images...")
-    all_images = []
-    for i, page in enumerate(pages[:50]):  # Limit to first 50 pages initially
-        print(f"  [{i+1}/{min(len(pages), 50)}] {page['name'][:50]}")
-        try:
-            images = extract_images_from_page(page['url'])
-            for img in images:
-                img['page_name'] = page['name']
-                img['page_url'] = page['url']
-                img['section'] = page['section']
-            all_images.extend(images)
-        except Exception as e:
-            print(f"    Error: {e}")
+    # Determine category
+    category = categorize_pathology(caption, section)
     
-    print(f"\n  Total images found: {len(all_images)}")
+    # Create filename
+    safe_name = sanitize_filename((section + '_' + caption[:30]) if caption else f"webpath_{i}")
+    ext = url.split('.')[-1].split('?')[0]
+    if ext not in ['jpg', 'jpeg', 'png', 'gif']:
+        ext = 'jpg'
+    filename = f"webpath_{safe_name}.{ext}"
+    dest_path = OUTPUT_DIR / category / filename
     
-    # Download images
-    print("\n[3] Downloading images...")
-    downloaded = 0
-    for i, img in enumerate(all_images):
-        url = img['url']
-        caption = img.get('caption', '')
-        section = img.get('section', '')
-        
-        # Skip non-images
-        if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
-            continue
-        
-        # Determine category
-        category = categorize_pathology(caption, section)
-        
-        # Create filename
-        safe_name = sanitize_filename((section + '_' + caption[:30]) if caption else f"webpath_{i}")
-        ext = url.split('.')[-1].split('?')[0]
-        if ext not in ['jpg', 'jpeg', 'png', 'gif']:
-            ext = 'jpg'
-        filename = f"webpath_{safe_name}.{ext}"
-        dest_path = OUTPUT_DIR / category / filename
-        
-        # Create metadata
-        metadata = create_metadata(
-            source_url=img.get('page_url', url),
-            license_type=LICENSE,
-            attribution=ATTRIBUTION,
-            caption=caption,
-            tags=['pathology', category, section],
-            section=section,
-            original_url=url
-        )
-        
-        # Download
-        if download_image(url, str(dest_path), metadata):
-            downloaded += 1
-            print(f"    ✓ {filename}")
+    # Create metadata
+    metadata = create_metadata(
+        source_url=img.get('page_url', url),
+        license_type=LICENSE,
+        attribution=ATTRIBUTION,
+        caption=caption,
+        tags=['pathology', category, section],
+        section=section,
+        original_url=url
+    )
     
-    print(f"\n[4] Downloaded {downloaded}/{len(all_images)} images")
-    print(f"    Location: {OUTPUT_DIR}")
+    # Download
+    downloaded = download_image(url, str(dest_path), metadata, probe=PROBE_RULES)
+    if downloaded:
+        print(f"    ✓ {filename}")
+        return True
+    if downloaded is None:
+        return None
+    return False
+
+# Images the probe rules out before their full transfer
+PROBE_RULES = ProbeRules(min_width=100, min_height=100)
+
+# Junk images dropped before any request is made
+IMAGE_FILTER = ImageFilter()
+
+SOURCE = Source('webpath_v1', discover=discover, extract=extract_page, download=download_one,
+                fetch=fetch_page, parse=parse_page, filter=IMAGE_FILTER)
+
+def main():
+    print("=" * 60)
+    print("WebPath (University of Utah) Extractor")
+    print("=" * 60)
     
-    # Save index
-    index_path = OUTPUT_DIR / 'webpath_index.json'
-    with open(index_path, 'w') as f:
-        json.dump({
-            'source': 'WebPath (University of Utah)',
-            'url': BASE_URL,
-            'license': LICENSE,
-            'total_images': len(all_images),
-            'downloaded': downloaded,
-            'images': all_images
-        }, f, indent=2)
-    print(f"    Index saved: {index_path}")
+    # Discover, extract and download as one streaming pipeline
+    print("\n[1] Crawling pages and downloading images...")
+    run_extractor(SOURCE, OUTPUT_DIR / 'webpath_index.json',
+                  source='WebPath (University of Utah)', url=BASE_URL, license=LICENSE)
+    print(f"    Location: {OUTPUT_DIR}")
 
 if __name__ == '__main__':
     main()
@@ -7,17 +7,26 @@ License: Educational use (requires attribution)
 import sys
 sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
 
-import re
-import json
-from bs4 import BeautifulSoup
+from itertools import islice
 from urllib.parse import urljoin
-from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, BASE_DIR
+from utils import rate_limited_request, download_image, sanitize_filename, create_metadata, configure_hosts, BASE_DIR, fetch_page, ProbeRules
+from utils.engine import Source, run_extractor
+from utils.frontier import SeenURLs
+from utils.parsing import PageParser, make_soup
+from utils.captions import DocumentIndex
+from utils.filters import ImageFilter, SKIP_PATTERNS
 
 BASE_URL = "https://webpath.med.utah.edu"
 OUTPUT_DIR = BASE_DIR / "pathology"
 LICENSE = "Educational Use - Attribution Required"
 ATTRIBUTION = "WebPath®, Edward C. Klatt MD, Mercer University School of Medicine"
 
+# Per-host politeness limits for this source
+RATE_LIMITS = {
+    'webpath.med.utah.edu': {'rate': 1.0, 'burst': 1, 'min_interval': 1.0},
+}
+configure_hosts(RATE_LIMITS)
+
 # Main sections based on actual website structure
 MAIN_PAGES = [
     '/GENERAL.html',
@@ -29,74 +38,48 @@ MAIN_PAGES = [
 ]
 
 def discover_pages():
-    """Discover all case pages from the main sections."""
-    all_pages = []
+    """Yield each unique case page as the main sections are scanned."""
+    seen = SeenURLs()
     
     for page in MAIN_PAGES:
         url = f"{BASE_URL}{page}"
         print(f"  Scanning: {url}")
         try:
             response = rate_limited_request(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all links
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                text = link.get_text(strip=True)
-                
-                # Skip navigation/empty links
-                if not text or len(text) < 2:
-                    continue
-                    
-                # Look for HTML pages (not images)
-                if href.endswith('.html') or href.endswith('.htm'):
-                    full_url = urljoin(url, href)
-                    # Skip self-links
-                    if full_url != url:
-                        all_pages.append({
-                            'name': text,
-                            'url': full_url,
-                            'section': page.split('/')[-1].replace('.html', '')
-                        })
+            soup = make_soup(response.text, 'a')
         except Exception as e:
             print(f"    Error scanning {url}: {e}")
-    
-    # Remove duplicates
-    seen = set()
-    unique_pages = []
-    for p in all_pages:
-        if p['url'] not in seen:
-            seen.add(p['url'])
-            unique_pages.append(p)
-    
-    return unique_pages
+            continue
+        
+        # Find all links
+        for link in soup.find_all('a', href=True):
+            href = link['href']
+            text = link.get_text(strip=True)
+            
+            # Skip navigation/empty links
+            if not text or len(text) < 2:
+                continue
+                
+            # Look for HTML pages (not images)
+            if href.endswith('.html') or href.endswith('.htm'):
+                full_url = urljoin(url, href)
+                # Skip self-links and duplicates
+                if full_url != url and seen.add(full_url):
+                    yield {
+                        'name': text,
+                        'url': full_url,
+                        'section': page.split('/')[-1].replace('.html', '')
+                    }
 
-def extract_images_from_page(url):
-    """Extract images from a WebPath page."""
-    response = rate_limited_request(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+def parse_page_images(soup, url):
+    """Images found on a parsed WebPath page."""
+    doc = DocumentIndex(soup)
     images = []
     
     for img in soup.find_all('img'):
         src = img.get('src', '')
         alt = img.get('alt', '')
         
-        # Skip navigation, icons, and small images
-        skip_patterns = ['icon', 'logo', 'button', 'nav', 'spacer', 'banner', 'menu', 'gif']
-        if any(x in src.lower() for x in skip_patterns):
-            continue
-        
-        # Skip very small images (likely icons)
-        width = img.get('width', '')
-        height = img.get('height', '')
-        if width and height:
-            try:
-                if int(width.replace('px', '')) < 50 or int(height.replace('px', '')) < 50:
-                    continue
-            except:
-                pass
-        
         # Get full URL
         full_url = urljoin(url, src)
         
@@ -106,14 +89,14 @@ def extract_images_from_page(url):
             # Look for text after the image
             parent = img.find_parent(['p', 'td', 'div'])
             if parent:
-                text = parent.get_text(strip=True)
+                text = doc.text(parent)
                 if text and len(text) < 500:
                     caption = text
         
         # Look for bold text before the image
         if not caption:
-            for elem in img.find_all_previous(['b', 'strong'], limit=2):
-                text = elem.get_text(strip=True)
+            for elem in doc.previous(img, ['b', 'strong'], limit=2):
+                text = doc.text(elem)
                 if text and len(text) < 200:
                     caption = text
                     break
@@ -121,11 +104,20 @@ def extract_images_from_page(url):
         images.append({
             'url': full_url,
             'caption': caption[:200] if caption else '',
-            'alt': alt
+            'alt': alt,
+            'width': img.get('width', ''),
+            'height': img.get('height', '')
         })
     
     return images
 
+page_parser = PageParser(parse_page_images)
+
+def extract_images_from_page(url):
+    """Extract images from a WebPath page."""
+    response = rate_limited_request(url)
+    return page_parser(response.text, url)
+
 def categorize_pathology(url, caption):
     """Determine pathology category from URL and caption."""
     text = (url + ' ' + caption).lower()
@@ -157,100 +149,77 @@ def categorize_pathology(url, caption):
     else:
         return 'general'
 
-def main():
-    print("=" * 60)
-    print("WebPath (University of Utah) Extractor - Revised")
-    print("=" * 60)
-    
-    # Discover pages
-    print("\n[1] Discovering pages...")
-    pages = discover_pages()
-    print(f"  Found {len(pages)} unique pages")
-    
+def discover():
+    """Case pages to crawl."""
     # Limit pages for testing
-    pages = pages[:100]
+    return islice(discover_pages(), 100)
+
+def parse_page(page, html):
+    """A page's images tagged with the page and section."""
+    images = page_parser(html, page['url'])
+    for img in images:
+        img['page_name'] = page['name']
+        img['page_url'] = page['url']
+        img['section'] = page['section']
+    return images
+
+def extract_page(page):
+    """Extract a page's images and tag them with the page and section."""
+    return parse_page(page, fetch_page(page))
+
+def download_one(img, i):
+    """Download one extracted image; returns None when it is skipped."""
+    url = img['url']
+    caption = img.get('caption', '')
     
-    # Extract images from each page
-    print("\n[2] Extracting images...")
-    all_images = []
-    for i, page in enumerate(pages):
-        if i % 10 == 0:
-            print(f"  [{i+1}/{len(pages)}] {page['name'][:50]}...")
-        try:
-            images = extract_images_from_page(page['url'])
-            for img in images:
-                img['page_name'] = page['name']
-                img['page_url'] = page['url']
-                img['section'] = page['section']
-            all_images.extend(images)
-        except Exception as e:
-            print(f"    Error: {e}")
+    # Only download actual image files
+    if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
+        return None
     
-    print(f"\n  Total images found: {len(all_images)}")
+    # Determine category
+    category = categorize_pathology(img.get('page_url', ''), caption)
     
-    # Download images
-    print("\n[3] Downloading images...")
-    downloaded = 0
-    skipped = 0
+    # Create filename
+    safe_name = sanitize_filename(caption[:40] if caption else f"webpath_{i}")
+    ext = url.split('.')[-1].split('?')[0]
+    if ext not in ['jpg', 'jpeg', 'png', 'gif']:
+        ext = 'jpg'
+    filename = f"webpath_{safe_name}.{ext}"
+    dest_path = OUTPUT_DIR / category / filename
     
-    for i, img in enumerate(all_images):
-        url = img['url']
-        caption = img.get('caption', '')
-        
-        # Skip navigation images
-        if any(x in url.lower() for x in ['gifs/', 'button', 'menu', 'icon']):
-            skipped += 1
-            continue
-        
-        # Only download actual image files
-        if not any(x in url.lower() for x in ['.jpg', '.jpeg', '.png', '.gif']):
-            skipped += 1
-            continue
-        
-        # Determine category
-        category = categorize_pathology(img.get('page_url', ''), caption)
-        
-        # Create filename
-        safe_name = sanitize_filename(caption[:40] if caption else f"webpath_{i}")
-        ext = url.split('.')[-1].split('?')[0]
-        if ext not in ['jpg', 'jpeg', 'png', 'gif']:
-            ext = 'jpg'
-        filename = f"webpath_{safe_name}.{ext}"
-        dest_path = OUTPUT_DIR / category / filename
-        
-        # Create metadata
-        metadata = create_metadata(
-            source_url=img.get('page_url', url),
-            license_type=LICENSE,
-            attribution=ATTRIBUTION,
-            caption=caption,
-            tags=['pathology', category],
-            section=img.get('section', ''),
-            original_url=url
-        )
-        
-        # Download
-        if download_image(url, str(dest_path), metadata):
-            downloaded += 1
-            if downloaded % 10 == 0:
-                print(f"    Downloaded {downloaded}...")
+    # Create metadata
+    metadata = create_metadata(
+        source_url=img.get('page_url', url),
+        license_type=LICENSE,
+        attribution=ATTRIBUTION,
+        caption=caption,
+        tags=['pathology', category],
+        section=img.get('section', ''),
+        original_url=url
+    )
     
-    print(f"\n[4] Downloaded {downloaded} images (skipped {skipped})")
-    print(f"    Location: {OUTPUT_DIR}")
+    # Download
+    return download_image(url, str(dest_path), metadata, probe=PROBE_RULES)
+
+# Images the probe rules out before their full transfer
+PROBE_RULES = ProbeRules(min_width=100, min_height=100)
+
+# Junk images dropped before any request is made
+IMAGE_FILTER = ImageFilter(skip_patterns=SKIP_PATTERNS + ['menu', 'gif'])
+
+SOURCE = Source('webpath', discover=discover, extract=extract_page, download=download_one,
+                fetch=fetch_page, parse=parse_page, filter=IMAGE_FILTER)
+
+def main():
+    print("=" * 60)
+    print("WebPath (University of Utah) Extractor - Revised")
+    print("=" * 60)
     
-    # Save index
-    index_path = OUTPUT_DIR / 'webpath_index.json'
-    with open(index_path, 'w') as f:
-        json.dump({
-            'source': 'WebPath (University of Utah)',
-            'url': BASE_URL,
-            'license': LICENSE,
-            'total_images': len(all_images),
-            'downloaded': downloaded,
-            'skipped': skipped,
-            'images': all_images
-        }, f, indent=2)
-    print(f"    Index saved: {index_path}")
+    # Discover, extract and download as one streaming pipeline
+    print("\n[1] Crawling pages and downloading images...")
+    run_extractor(SOURCE, OUTPUT_DIR / 'webpath_index.json',
+                  source='WebPath (University of Utah)', url=BASE_URL, license=LICENSE)
+    print(f"    Location: {OUTPUT_DIR}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Wikimedia Commons Offline Importer
+Builds the Commons image index from locally downloaded SQL dumps
+(https://dumps.wikimedia.org/commonswiki/latest/) instead of the live API.
+Usage: wikimedia_dump.py <dump_dir> [depth]
+"""
+import sys
+sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
+
+from utils import IndexWriter, BASE_DIR
+from utils.commons_dump import dump_paths, import_records
+from master_extractor import SOURCES
+
+OUTPUT_DIR = BASE_DIR / "anatomy"
+LICENSE = "CC BY-SA / Public Domain"
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return 1
+    paths = dump_paths(sys.argv[1])
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    categories = SOURCES['wikimedia_api']['categories']
+
+    print("=" * 60)
+    print("Wikimedia Commons Offline Importer")
+    print("=" * 60)
+    print(f"\n[1] Selecting files in {len(categories)} categories (depth {depth})...")
+
+    index_path = OUTPUT_DIR / 'wikimedia_dump_index.json'
+    with IndexWriter(index_path, source='Wikimedia Commons (dump)', license=LICENSE) as index:
+        for img in import_records(paths, categories, depth=depth):
+            index.add(img)
+            if index.count % 1000 == 0:
+                print(f"  Progress: {index.count} records")
+        total = index.count
+        index.close(total_images=total)
+
+    print(f"\n[2] Imported {total} records")
+    print(f"    Index saved: {index_path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Distributed extraction worker
+Runs extractor sources from a shared work queue so several nodes can crawl at
+once. Seed the queue once, then start a worker on every node:
+Usage: worker.py seed <queue.sqlite> <extractor> [extractor ...]
+       worker.py work <queue.sqlite> <extractor> [extractor ...]
+       worker.py status <queue.sqlite>
+"""
+import sys
+sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images')
+
+import importlib
+from utils.workqueue import WorkQueue, seed, work
+
+WORKERS = 8     # items processed at once on this node
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('seed', 'work', 'status'):
+        print(__doc__)
+        return 1
+    command, queue_path, names = sys.argv[1], sys.argv[2], sys.argv[3:]
+    queue = WorkQueue(queue_path)
+    sources = {}
+    for name in names:
+        source = importlib.import_module(name).SOURCE
+        sources[source.name] = source
+
+    if command == 'seed':
+        for source in sources.values():
+            print(f"Seeding {source.name}...")
+            print(f"  {seed(queue, source)} new pages queued")
+    elif command == 'work':
+        print(f"Worker {queue.node} on {', '.join(sources)}")
+        result = work(queue, sources, workers=WORKERS)
+        print(f"  {result['pages']} pages, {result['downloaded']} downloaded, "
+              f"{result['failed']} failed, {result['skipped']} skipped")
+    print(f"Queue: {queue.counts()}")
+    queue.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
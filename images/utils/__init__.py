@@ -2,54 +2,355 @@
 Utility functions for medical image extraction.
 """
 import os
+import re
 import time
-import json
 import hashlib
 import requests
-from urllib.parse import urlparse, unquote
+from urllib.parse import urlparse, urlsplit, urlunsplit, unquote
 from pathlib import Path
+from .ratelimit import HostRateLimiter, TokenBucket, host_of
+from .session import get_session, configure_pools, configure_host_pool, close_session, USER_AGENT, TIMEOUT
+from .index import IndexWriter
+from .files import HashingWriter, write_json_atomic, record_hashes, known_hashes, CHUNK_SIZE
+from .store import ContentStore
+from .httpcache import HTTPCache
+from .retry import RetryPolicy, HostBreakers, RETRY_STATUSES, parse_retry_after
+from .checkpoint import CrawlState
+from .frontier import Frontier, SeenURLs, canonicalize_url
+from .filters import ImageFilter
+from .probe import ProbeRules, image_info, PROBE_BYTES
+from .adaptive import AdaptiveLimits
+from .singleflight import SingleFlight
 
-# Rate limiting - 1 second between requests
-_last_request_time = 0
+# Rate limiting - one token bucket per host, 1 request/second unless configured
+rate_limiter = HostRateLimiter()
+
+def configure_host(host, rate=None, burst=None, min_interval=None, pool_maxsize=None,
+                   max_rate=None, max_concurrency=None):
+    """Set the request rate, burst size, minimum gap and pool size for one host.
+    
+    max_rate and max_concurrency are the ceilings the adaptive limits may
+    raise the host to; without max_rate the rate never exceeds rate.
+    """
+    rate_limiter.configure(host, rate=rate, burst=burst, min_interval=min_interval)
+    adaptive_limits.configure(host, rate=rate, min_interval=min_interval, max_rate=max_rate,
+                              max_concurrency=max_concurrency)
+    if pool_maxsize is not None:
+        configure_host_pool(host, pool_maxsize)
+
+def configure_hosts(limits):
+    """Apply a {host: {'rate': ..., 'burst': ..., 'min_interval': ..., 'pool_maxsize': ..., 'max_rate': ...}} mapping."""
+    for host, config in limits.items():
+        configure_host(host, **config)
+
+# Optional cap on the combined transfer rate of all image downloads
+bandwidth = None
+
+def limit_bandwidth(bytes_per_second):
+    """Cap image download bytes per second across all threads; None lifts the cap."""
+    global bandwidth
+    bandwidth = TokenBucket(rate=bytes_per_second, burst=bytes_per_second, min_interval=0) if bytes_per_second else None
+
+# Retries - jittered exponential backoff, Retry-After, per-host circuit breakers
+retry_policy = RetryPolicy()
+breakers = HostBreakers()
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+# Concurrent requests for one exact URL share a single transfer
+requests_in_flight = SingleFlight()
+downloads_in_flight = SingleFlight()
+
+def flight_key(url):
+    """url with its scheme and host lowercased and its fragment dropped.
+    
+    Unlike canonicalize_url this keeps every query parameter and the exact
+    path, so two Wikimedia renditions or two differently-parameterised API
+    calls never share a transfer.
+    """
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
 
 def rate_limited_request(url, **kwargs):
-    """Make a rate-limited HTTP request."""
-    global _last_request_time
-    elapsed = time.time() - _last_request_time
-    if elapsed < 1.0:
-        time.sleep(1.0 - elapsed)
+    """Make a rate-limited HTTP request, retrying transient failures.
     
+    Plain (non-streaming) requests go through the HTTP cache: stored
+    validators are sent along and a 304 is answered from the cached body.
+    Concurrent plain requests for the same URL, parameters and headers
+    are coalesced and all receive the one response.
+    """
     headers = kwargs.pop('headers', {})
-    headers.setdefault('User-Agent', 'MedicalImageBot/1.0 (Educational/Research Purpose)')
+    headers.setdefault('User-Agent', USER_AGENT)
+    kwargs.setdefault('timeout', TIMEOUT)
+    
+    if kwargs.get('stream') or 'Range' in headers:
+        return _send(url, headers, kwargs)
+    
+    params = kwargs.get('params') or {}
+    params = sorted(params.items()) if isinstance(params, dict) else params
+    flight = (flight_key(url), repr(params), repr(sorted(headers.items())))
+    return requests_in_flight.do(flight, _get, url, headers, kwargs)
+
+def _get(url, headers, kwargs):
+    """A plain GET, answered from the HTTP cache when the server allows it."""
+    if http_cache is None:
+        return _send(url, headers, kwargs)
     
-    response = requests.get(url, headers=headers, timeout=30, **kwargs)
-    _last_request_time = time.time()
+    key = http_cache.key(url, kwargs.get('params'))
+    entry = http_cache.get(key)
+    if entry and entry.get('has_body'):
+        headers.update(http_cache.conditional_headers(entry))
+    response = _send(url, headers, kwargs)
+    if response.status_code == 304 and entry and entry.get('has_body'):
+        return http_cache.respond(key, entry, response)
+    http_cache.store(key, response)
     return response
 
-def download_image(url, dest_path, metadata=None):
-    """Download an image and save with metadata."""
-    try:
-        response = rate_limited_request(url)
-        response.raise_for_status()
-        
-        # Create directory if needed
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        
-        # Save image
-        with open(dest_path, 'wb') as f:
-            f.write(response.content)
+def fetch_page(page):
+    """HTML of a crawl page (a dict with a 'url' key)."""
+    return rate_limited_request(page['url']).text
+
+def _send(url, headers, kwargs):
+    """Send a GET under the rate limiter, retry policy and host breaker."""
+    host = host_of(url)
+    breaker = breakers.get(host)
+    
+    for attempt in range(retry_policy.max_attempts):
+        last_attempt = attempt + 1 >= retry_policy.max_attempts
+        breaker.before_request()
+        rate_limiter.acquire(url)
+        started = time.monotonic()
+        try:
+            response = get_session().get(url, headers=headers, **kwargs)
+        except TRANSIENT_ERRORS:
+            adaptive_limits.observe(host, None)
+            breaker.record_failure()
+            if last_attempt:
+                raise
+            time.sleep(retry_policy.delay(attempt))
+            continue
+        except BaseException:
+            breaker.record_failure()
+            raise
+        adaptive_limits.observe(host, time.monotonic() - started, response.status_code)
         
-        # Save metadata alongside
-        if metadata:
-            meta_path = dest_path + '.json'
-            with open(meta_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+        if response.status_code not in RETRY_STATUSES:
+            breaker.record_success()
+            return response
         
+        # Throttled or server trouble: pause the whole host if asked to
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        breaker.record_failure(hold=retry_after)
+        if last_attempt:
+            return response
+        response.close()
+        time.sleep(retry_policy.delay(attempt, retry_after))
+
+PROGRESS_EVERY = 1024 * 1024  # bytes between progress checkpoints of a partial
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+def download_image(url, dest_path, metadata=None, probe=None):
+    """Stream an image to disk and save with metadata.
+    
+    The body is written in chunks to a partial file that is renamed into place
+    only when complete, and hashed on the way so the file is never re-read.
+    A partial left by an interrupted attempt is resumed with a Range request
+    when the server supports it; a connection dropped mid-body is retried
+    that way under the retry policy. A stored image whose validators are
+    cached is revalidated with a conditional request instead of refetched.
+    
+    With probe (a ProbeRules), a new image is first probed with a small Range
+    request and skipped, returning None, if the rules reject it; the probed
+    bytes then start the download. Concurrent downloads of one URL fetch it
+    once and link every destination to the same blob.
+    """
+    try:
+        # A download of the same URL already running on another thread is
+        # waited for, and its blob linked at this path too
+        flight = (flight_key(url), id(probe))
+        sha256 = downloads_in_flight.do(flight, _obtain_blob, url, dest_path, probe)
+        if not sha256:
+            return sha256
+        _place(sha256, dest_path, url, metadata)
         return True
     except Exception as e:
         print(f"Failed to download {url}: {e}")
         return False
 
+def _obtain_blob(url, dest_path, probe=None):
+    """SHA-256 of url's stored blob, downloading it first if needed.
+    
+    Returns None when the probe rules skip the image and False when the
+    probe fails.
+    """
+    # A URL whose content is already stored only needs its path linked,
+    # after a cheap revalidation when the server gave us validators
+    sha256 = content_store.lookup(url)
+    cached = http_cache.get(http_cache.key(url)) if http_cache and sha256 else None
+    if sha256 and not (cached and cached.get('sha256') == sha256):
+        return sha256
+    
+    if probe and not sha256:
+        info = probe_image(url)
+        if info['status'] >= 400:
+            print(f"Failed to download {url}: HTTP {info['status']}")
+            return False
+        reason = probe.reject(info)
+        if reason:
+            print(f"Skipped {url}: {reason}")
+            return None
+        _seed_partial(url, dest_path, info)
+    
+    for attempt in range(retry_policy.max_attempts):
+        try:
+            return _fetch_blob(url, dest_path, cached)
+        except TRANSIENT_ERRORS:
+            if attempt + 1 >= retry_policy.max_attempts:
+                raise
+            time.sleep(retry_policy.delay(attempt))
+
+def _fetch_blob(url, dest_path, cached=None):
+    """Download url into the content store, resuming any partial; returns its SHA-256.
+    
+    cached is the HTTP cache entry of a blob already stored for url; if the
+    server answers 304 to its validators that blob is reused as is.
+    """
+    writer = HashingWriter(dest_path, url)
+    total = None
+    try:
+        offset = writer.resume_offset()
+        conditional = http_cache.conditional_headers(cached) if cached and not offset else {}
+        response = _request_from(url, writer, offset, conditional)
+        if response.status_code == 304 and conditional:
+            response.close()
+            writer.discard()
+            http_cache.touch(http_cache.key(url))
+            return cached['sha256']
+        if offset and (response.status_code == 416 and writer.expected_total != offset
+                       or response.status_code == 206 and not _continues(response, offset, writer.expected_total)):
+            # The kept bytes do not match the resource any more; start over
+            response.close()
+            offset = 0
+            response = _request_from(url, writer, offset)
+        with response:
+            if offset and response.status_code == 416:
+                # Nothing left to send: the partial already holds the whole body
+                writer.start(offset)
+            else:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    offset = 0
+                    writer.validators = _validators(response)
+                writer.start(offset)
+                length = response.headers.get('Content-Length')
+                total = offset + int(length) if length and length.isdigit() else None
+                writer.save_progress(total)
+                checkpoint = writer.size + PROGRESS_EVERY
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if bandwidth:
+                        bandwidth.acquire(len(chunk))
+                    writer.write(chunk)
+                    if writer.size >= checkpoint:
+                        writer.save_progress(total)
+                        checkpoint = writer.size + PROGRESS_EVERY
+        writer.finish()
+    except BaseException:
+        # Keep any resumable partial for the next attempt
+        writer.suspend(total)
+        raise
+    
+    # Store the blob once; the readable path is linked to it by the caller
+    sha256 = writer.sha256.hexdigest()
+    blob = content_store.add(writer.tmp_path, sha256)
+    record_hashes(blob, writer.md5.hexdigest(), sha256)
+    if http_cache:
+        http_cache.remember(http_cache.key(url), url, sha256=sha256,
+                            etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified'))
+    return sha256
+
+def probe_image(url):
+    """Status, Content-Type, total size and pixel dimensions of an image.
+    
+    Only the first PROBE_BYTES are requested; a server that ignores the Range
+    header has its response closed after them.
+    """
+    response = rate_limited_request(url, stream=True, headers={'Range': f'bytes=0-{PROBE_BYTES - 1}'})
+    with response:
+        data = b''
+        if response.status_code < 400:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                data += chunk
+                if len(data) >= PROBE_BYTES:
+                    break
+        headers = response.headers
+        length = headers.get('Content-Length')
+        if response.status_code == 206:
+            length = headers.get('Content-Range', '').rpartition('/')[2]
+        fmt, width, height = image_info(data)
+        return {
+            'status': response.status_code,
+            'content_type': headers.get('Content-Type', '').split(';')[0].strip().lower(),
+            'length': int(length) if length and length.isdigit() else None,
+            'format': fmt,
+            'width': width,
+            'height': height,
+            'data': data[:PROBE_BYTES],
+            'resumable': response.status_code == 206 and not headers.get('Content-Encoding'),
+            'validators': _validators(response),
+        }
+
+def _seed_partial(url, dest_path, info):
+    """Keep the probed bytes as the start of the download when it can resume from them."""
+    if not (info['resumable'] and info['validators'] and info['data']):
+        return
+    writer = HashingWriter(dest_path, url)
+    if writer.resume_offset():
+        writer.close()
+        return
+    writer.validators = info['validators']
+    writer.start(0)
+    writer.write(info['data'])
+    writer.suspend(info['length'])
+
+def _place(sha256, dest_path, url, metadata):
+    """Link dest_path to a stored blob and save metadata alongside."""
+    final_path = content_store.place(sha256, dest_path, url)
+    if metadata:
+        size = os.path.getsize(content_store.blob_path(sha256))
+        write_json_atomic(final_path + '.json', dict(metadata, sha256=sha256, size=size))
+    return final_path
+
+def _request_from(url, writer, offset, conditional=None):
+    """Request url, asking only for the bytes after offset when resuming."""
+    headers = dict(conditional or {})
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = writer.validators.get('etag') or writer.validators['last_modified']
+    return rate_limited_request(url, stream=True, headers=headers)
+
+def _continues(response, offset, expected_total):
+    """Whether a 206 answer starts at offset of a resource of the expected size."""
+    match = CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+    if not match or int(match.group(1)) != offset:
+        return False
+    total = int(match.group(3)) if match.group(3) != '*' else None
+    if total is not None and expected_total is not None and total != expected_total:
+        return False
+    length = response.headers.get('Content-Length')
+    if total is not None and length and length.isdigit() and offset + int(length) != total:
+        return False
+    return True
+
+def _validators(response):
+    """Validators that make a later Range request safe to splice on."""
+    validators = {}
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        validators['etag'] = etag
+    if response.headers.get('Last-Modified'):
+        validators['last_modified'] = response.headers['Last-Modified']
+    return validators
+
 def sanitize_filename(filename):
     """Create a safe filename from a string."""
     # Remove or replace unsafe characters
@@ -72,6 +373,9 @@ def create_metadata(source_url, license_type, attribution, caption, tags, **extr
 
 def get_file_hash(filepath):
     """Get MD5 hash of a file for integrity checking."""
+    known = known_hashes(filepath)
+    if known:
+        return known[0]
     md5 = hashlib.md5()
     with open(filepath, 'rb') as f:
         for chunk in iter(lambda: f.read(8192), b''):
@@ -79,3 +383,31 @@ def get_file_hash(filepath):
     return md5.hexdigest()
 
 BASE_DIR = Path('/Users/dannygomez/.openclaw/workspace/biological-self/images')
+
+# Content-addressed blobs that the category paths link to (nothing is
+# created on disk until the first image is stored)
+content_store = ContentStore(BASE_DIR / 'store')
+
+# Per-host rates and concurrency learned from responses; kept in memory
+# until a crawl calls share_host_limits()
+adaptive_limits = AdaptiveLimits(rate_limiter)
+
+# Conditional-request cache for pages, API responses and image validators
+http_cache = HTTPCache(BASE_DIR / '.cache' / 'http')
+
+RATE_LIMIT_DIR = BASE_DIR / '.ratelimit'
+
+def share_host_limits(directory=RATE_LIMIT_DIR):
+    """Share token buckets with every crawl process on this machine and keep learned limits.
+    
+    Called by the process that owns a crawl (CrawlEngine.run, workqueue.work),
+    so importing utils alone - parse workers, check_parsers.py, one-off
+    scripts - leaves the shared state untouched. Safe to call repeatedly.
+    """
+    rate_limiter.share(directory)
+    adaptive_limits.persist(Path(directory) / 'adaptive.json')
+
+
+def crawl_state(name):
+    """Checkpoint database for one source's crawl."""
+    return CrawlState(BASE_DIR / '.crawl' / f'{name}.sqlite')
@@ -0,0 +1,194 @@
+"""
+Adaptive per-host request rate and concurrency (AIMD).
+
+Every response is reported with its latency. After each healthy window of
+WINDOW requests a host's rate grows by INCREASE requests/second and its
+concurrency by one, up to the host's ceilings. A timeout, a connection error,
+a 429 or 503, too many other server errors, or a window whose p95 latency
+has risen LATENCY_RISE times above the host's usual p95 multiplies both by
+DECREASE instead. Hosts without a configured max_rate never go above their
+configured rate; the controller then only backs off and recovers.
+
+Once persist() names a JSON file, the learned limits are saved there and
+applied again on the next run, so each host starts from what it sustained
+last time.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from .files import write_json_atomic
+
+WINDOW = 20             # requests per host between adjustments
+INCREASE = 0.25         # requests/second added after a healthy window
+DECREASE = 0.5          # factor applied to rate and concurrency on trouble
+COOLDOWN = 5.0          # seconds between two decreases for one host
+LATENCY_RISE = 2.0      # window p95 over the usual p95 that counts as trouble
+ERROR_RATE = 0.1        # share of 5xx responses in a window that counts as trouble
+MIN_RATE = 0.1
+CONCURRENCY = 4         # default per-host concurrency ceiling
+SAVE_EVERY = 30.0       # seconds between saves of the learned limits
+
+THROTTLE_STATUSES = {429, 503}
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class _Host:
+    def __init__(self, rate, min_interval, max_rate, max_concurrency):
+        self.rate = rate
+        self.min_interval = min_interval
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.concurrency = min(CONCURRENCY, max_concurrency)
+        self.latencies = deque(maxlen=WINDOW)
+        self.errors = 0
+        self.usual_p95 = None
+        self.last_decrease = 0.0
+
+
+class AdaptiveLimits:
+    """Learns each host's sustainable rate and concurrency from its responses."""
+
+    def __init__(self, limiter, path=None):
+        self.limiter = limiter
+        self.path = str(path) if path else None
+        self._hosts = {}
+        self._learned = {}
+        self._lock = threading.Lock()
+        self._saved = time.monotonic()
+        if path:
+            self.persist(path)
+
+    def persist(self, path):
+        """Start hosts from the limits saved at path and save there on exit.
+
+        Only the process that owns a crawl should call this; hosts already
+        configured switch to their learned limits at once.
+        """
+        path = str(path)
+        if self.path == path:
+            return
+        try:
+            with open(path) as f:
+                learned = json.load(f)
+        except (OSError, ValueError):
+            learned = {}
+        with self._lock:
+            first = self.path is None
+            self.path = path
+            self._learned = learned
+            adopted = [(host, state) for host, state in self._hosts.items() if self._adopt(host, state)]
+        for host, state in adopted:
+            self._apply(host, state)
+        if first:
+            atexit.register(self.save)
+
+    def configure(self, host, rate=None, min_interval=None, max_rate=None, max_concurrency=None):
+        """Set a host's limits and ceilings; a learned rate within them is applied at once."""
+        host = host.lower()
+        with self._lock:
+            state = self._host(host)
+            if rate is not None:
+                state.rate = float(rate)
+            if min_interval is not None:
+                state.min_interval = float(min_interval)
+            state.max_rate = float(max_rate) if max_rate is not None else max(state.max_rate, state.rate)
+            if max_concurrency is not None:
+                state.max_concurrency = int(max_concurrency)
+            if not self._adopt(host, state):
+                return
+        self._apply(host, state)
+
+    def _adopt(self, host, state):
+        """Move host to the limits learned for it earlier, within its ceilings."""
+        learned = self._learned.get(host)
+        if not learned:
+            state.concurrency = min(state.concurrency, state.max_concurrency)
+            return False
+        state.rate = min(state.max_rate, max(MIN_RATE, learned['rate']))
+        state.concurrency = min(state.max_concurrency, max(1, learned['concurrency']))
+        return True
+
+    def concurrency(self, host):
+        """How many requests may be in flight to host right now."""
+        with self._lock:
+            return self._host(host.lower()).concurrency
+
+    def observe(self, host, latency=None, status=None):
+        """Report one request: its latency in seconds, or None if it timed out or failed to connect."""
+        host = host.lower()
+        now = time.monotonic()
+        with self._lock:
+            state = self._host(host)
+            if latency is None or status in THROTTLE_STATUSES:
+                changed = self._decrease(state, now)
+            else:
+                state.latencies.append(latency)
+                if status is not None and status >= 500:
+                    state.errors += 1
+                changed = len(state.latencies) >= WINDOW and self._evaluate(state, now)
+            due = self.path and now - self._saved >= SAVE_EVERY
+        if changed:
+            self._apply(host, state)
+        if due:
+            self.save()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            limits = self.limiter.limits(host)
+            state = _Host(limits['rate'], limits['min_interval'], limits['rate'], CONCURRENCY)
+            self._hosts[host] = state
+        return state
+
+    def _evaluate(self, state, now):
+        p95 = _p95(state.latencies)
+        errors = state.errors / len(state.latencies)
+        state.latencies.clear()
+        state.errors = 0
+        if errors > ERROR_RATE or (state.usual_p95 and p95 > LATENCY_RISE * state.usual_p95):
+            return self._decrease(state, now)
+        state.usual_p95 = p95 if state.usual_p95 is None else 0.8 * state.usual_p95 + 0.2 * p95
+        state.rate = min(state.max_rate, state.rate + INCREASE)
+        state.concurrency = min(state.max_concurrency, state.concurrency + 1)
+        return True
+
+    def _decrease(self, state, now):
+        state.latencies.clear()
+        state.errors = 0
+        if now - state.last_decrease < COOLDOWN:
+            return False
+        state.last_decrease = now
+        state.rate = max(MIN_RATE, state.rate * DECREASE)
+        state.concurrency = max(1, int(state.concurrency * DECREASE))
+        return True
+
+    def _apply(self, host, state):
+        # The configured minimum gap must not cap a rate learned above it
+        self.limiter.configure(host, rate=state.rate, min_interval=min(state.min_interval, 1.0 / state.rate))
+
+    def limits(self):
+        """{host: {'rate': ..., 'concurrency': ...}} as learned so far."""
+        with self._lock:
+            return {host: {'rate': round(state.rate, 3), 'concurrency': state.concurrency}
+                    for host, state in self._hosts.items()}
+
+    def save(self):
+        """Write the learned limits, keeping hosts not seen this run."""
+        if not self.path:
+            return
+        with self._lock:
+            self._saved = time.monotonic()
+            learned = dict(self._learned)
+        learned.update(self.limits())
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            write_json_atomic(self.path, learned)
+        except OSError as e:
+            print(f"Could not save learned host limits: {e}")
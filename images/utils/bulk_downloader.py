@@ -9,39 +9,89 @@ sys.path.insert(0, '/Users/dannygomez/.openclaw/workspace/biological-self/images
 import os
 import subprocess
 import json
-from pathlib import Path
-from utils import BASE_DIR
+import requests
+from utils import download_image, probe_image, content_store
+
+def _finish_partial(part_path, dest_path, ok):
+    """Move a completed partial into place; discard a failed one.
+
+    wget and curl cannot check that the server still has the same file, so a
+    partial they leave behind is never resumed.
+    """
+    if ok and os.path.exists(part_path) and os.path.getsize(part_path) > 100:
+        os.replace(part_path, dest_path)
+        return True
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    return False
 
 def download_with_wget(url, dest_path):
     """Download using wget with rate limiting."""
+    part_path = dest_path + '.part'
     try:
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
         result = subprocess.run([
-            'wget', '-q', '--limit-rate=100k', '-O', dest_path,
+            'wget', '-q', '--limit-rate=100k', '-O', part_path,
             '--user-agent=MedicalImageBot/1.0 (Educational)',
             '--timeout=30', '--tries=2',
             url
         ], capture_output=True, timeout=60)
-        return result.returncode == 0 and os.path.exists(dest_path) and os.path.getsize(dest_path) > 100
+        return _finish_partial(part_path, dest_path, result.returncode == 0)
     except Exception as e:
         return False
 
 def download_with_curl(url, dest_path):
     """Download using curl with rate limiting."""
+    part_path = dest_path + '.part'
     try:
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
         result = subprocess.run([
             'curl', '-s', '-L', '--max-time', '30', '--retry', '2',
             '-A', 'MedicalImageBot/1.0 (Educational)',
-            '--rate-limit', '100k',
-            '-o', dest_path, url
+            '--limit-rate', '100k',
+            '-o', part_path, url
         ], capture_output=True, timeout=60)
-        return result.returncode == 0 and os.path.exists(dest_path) and os.path.getsize(dest_path) > 100
+        return _finish_partial(part_path, dest_path, result.returncode == 0)
     except Exception as e:
         return False
 
-def smart_download(url, dest_path):
-    """Try wget first, then curl."""
+def download_with_session(url, dest_path):
+    """Download over the shared keep-alive session.
+    
+    The image may land under a hash-suffixed name or only in the store's
+    catalog, so the size check reads the stored blob rather than dest_path.
+    """
+    try:
+        if not download_image(url, dest_path):
+            return False
+        sha256 = content_store.lookup(url)
+        return bool(sha256) and os.path.getsize(content_store.blob_path(sha256)) > 100
+    except OSError as e:
+        print(f"Session download of {url} failed: {e}")
+        return False
+
+def smart_download(url, dest_path, probe=None):
+    """Try the pooled session first, then wget, then curl.
+    
+    The session resumes the partial it left behind when the server gave
+    validators to check it against; wget and curl start from byte zero. With
+    probe (a ProbeRules) the image is probed first and skipped, returning
+    None, when the rules reject it. A probe that fails is ignored and the
+    download is attempted anyway.
+    """
+    if probe:
+        try:
+            info = probe_image(url)
+        except (requests.RequestException, OSError) as e:
+            print(f"Probe of {url} failed: {e}")
+            info = None
+        if info:
+            reason = f"HTTP {info['status']}" if info['status'] >= 400 else probe.reject(info)
+            if reason:
+                print(f"Skipped {url}: {reason}")
+                return None
+    if download_with_session(url, dest_path):
+        return True
     if download_with_wget(url, dest_path):
         return True
     return download_with_curl(url, dest_path)
@@ -64,4 +114,4 @@ DIRECT_SOURCES = {
 
 if __name__ == '__main__':
     print("Bulk downloader ready")
-    print("Use smart_download(url, dest_path) to download images")
+    print("Use smart_download(url, dest_path, probe=ProbeRules()) to download images")
@@ -0,0 +1,72 @@
+"""
+Single-pass caption context for parsed pages.
+
+Resolving a caption per image with find_all_next / find_all_previous /
+find_parent(...).get_text walks large parts of the document again for every
+image, which is quadratic on image-heavy pages. A DocumentIndex walks the
+tree once, recording every tag's document-order position and the extent of
+its subtree, so the same questions become binary searches, and each
+element's text is computed at most once.
+"""
+import bisect
+
+
+class DocumentIndex:
+    """Document-order index of a soup's tags answering neighbour queries.
+
+    next, previous and first_within return what find_all_next,
+    find_all_previous and find give for the same tag names.
+    """
+
+    def __init__(self, soup):
+        self.tags = soup.find_all(True)
+        self._pos = {id(tag): i for i, tag in enumerate(self.tags)}
+        # Position of the last tag inside each tag's subtree
+        self._end = list(range(len(self.tags)))
+        for i in range(len(self.tags) - 1, -1, -1):
+            parent = self._pos.get(id(self.tags[i].parent))
+            if parent is not None and self._end[i] > self._end[parent]:
+                self._end[parent] = self._end[i]
+        self._by_names = {}
+        self._text = {}
+
+    def _positions(self, names):
+        key = (names,) if isinstance(names, str) else tuple(sorted(names))
+        positions = self._by_names.get(key)
+        if positions is None:
+            wanted = set(key)
+            positions = [i for i, tag in enumerate(self.tags) if tag.name in wanted]
+            self._by_names[key] = positions
+        return positions
+
+    def next(self, tag, names, limit=None):
+        """Tags named names that follow tag in the document, nearest first."""
+        positions = self._positions(names)
+        start = bisect.bisect_right(positions, self._pos[id(tag)])
+        stop = len(positions) if limit is None else start + limit
+        return [self.tags[i] for i in positions[start:stop]]
+
+    def previous(self, tag, names, limit=None):
+        """Tags named names that precede tag (ancestors included), nearest first."""
+        positions = self._positions(names)
+        stop = bisect.bisect_left(positions, self._pos[id(tag)])
+        start = 0 if limit is None else max(0, stop - limit)
+        return [self.tags[i] for i in reversed(positions[start:stop])]
+
+    def first_within(self, tag, names):
+        """The first tag named names inside tag, or None."""
+        positions = self._positions(names)
+        pos = self._pos[id(tag)]
+        i = bisect.bisect_right(positions, pos)
+        if i < len(positions) and positions[i] <= self._end[pos]:
+            return self.tags[positions[i]]
+        return None
+
+    def text(self, tag):
+        """tag.get_text(strip=True), computed once per tag."""
+        key = id(tag)
+        text = self._text.get(key)
+        if text is None:
+            text = tag.get_text(strip=True)
+            self._text[key] = text
+        return text
@@ -0,0 +1,155 @@
+"""
+SQLite-backed crawl checkpoints.
+
+A CrawlState records the pages a source has discovered (its frontier), which
+of them have been extracted along with the images found there, and the
+download status of every image. The database runs in WAL mode and is updated
+as the crawl goes, so an interrupted run picks up where it stopped: finished
+pages are not fetched again and downloaded images are not downloaded again.
+Once a crawl finishes, the next run starts a fresh one.
+"""
+import os
+import json
+import sqlite3
+import threading
+
+MAX_IMAGE_ATTEMPTS = 3  # failed downloads retried on later runs up to this many tries
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT UNIQUE NOT NULL,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending'
+);
+CREATE TABLE IF NOT EXISTS images (
+    page_url TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    url TEXT,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (page_url, ordinal)
+);
+"""
+
+_OUTCOMES = {True: 'downloaded', False: 'failed', None: 'skipped'}
+
+
+class CrawlState:
+    """Persistent frontier, visited pages and image statuses for one source."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _get_meta(self, key):
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def begin(self):
+        """Start a run: a crawl that finished last time is started over."""
+        with self._lock, self._db:
+            if self._get_meta('finished'):
+                self._db.execute('DELETE FROM images')
+                self._db.execute('DELETE FROM pages')
+                self._db.execute('DELETE FROM meta')
+
+    def finish(self):
+        """Mark the crawl as complete."""
+        with self._lock, self._db:
+            self._set_meta('finished', '1')
+
+    # Frontier
+
+    def discovery_complete(self):
+        with self._lock:
+            return bool(self._get_meta('discovered'))
+
+    def mark_discovered(self):
+        with self._lock, self._db:
+            self._set_meta('discovered', '1')
+
+    def add_page(self, page):
+        """Add a discovered page to the frontier (once)."""
+        with self._lock, self._db:
+            self._db.execute('INSERT OR IGNORE INTO pages (url, data) VALUES (?, ?)',
+                             (page.get('url', ''), json.dumps(page)))
+
+    def pages(self):
+        """All frontier pages in discovery order."""
+        with self._lock:
+            rows = self._db.execute('SELECT data FROM pages ORDER BY seq').fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    # Visited pages
+
+    def page_done(self, url):
+        with self._lock:
+            row = self._db.execute('SELECT status FROM pages WHERE url = ?', (url,)).fetchone()
+        return bool(row) and row[0] == 'done'
+
+    def save_page(self, page, images):
+        """Record a page's extracted images and mark it visited, atomically."""
+        url = page.get('url', '')
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM images WHERE page_url = ?', (url,))
+            self._db.executemany(
+                'INSERT INTO images (page_url, ordinal, url, data) VALUES (?, ?, ?, ?)',
+                [(url, i, img.get('url'), json.dumps(img)) for i, img in enumerate(images)])
+            self._db.execute('INSERT OR IGNORE INTO pages (url, data) VALUES (?, ?)', (url, json.dumps(page)))
+            self._db.execute("UPDATE pages SET status = 'done' WHERE url = ?", (url,))
+
+    def page_images(self, url):
+        """The images recorded for a visited page, in page order."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT data FROM images WHERE page_url = ? ORDER BY ordinal', (url,)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    # Image downloads
+
+    def image_outcome(self, page_url, ordinal):
+        """Outcome to reuse for an image finished on an earlier run, or 'pending'."""
+        with self._lock:
+            row = self._db.execute('SELECT status, attempts FROM images WHERE page_url = ? AND ordinal = ?',
+                                   (page_url, ordinal)).fetchone()
+        if not row:
+            return 'pending'
+        status, attempts = row
+        if status == 'downloaded':
+            return True
+        if status == 'skipped':
+            return None
+        if status == 'failed' and attempts >= MAX_IMAGE_ATTEMPTS:
+            return False
+        return 'pending'
+
+    def mark_image(self, page_url, ordinal, outcome):
+        """Record a download outcome (True, False, or None for skipped)."""
+        with self._lock, self._db:
+            self._db.execute(
+                'UPDATE images SET status = ?, attempts = attempts + 1 WHERE page_url = ? AND ordinal = ?',
+                (_OUTCOMES[outcome], page_url, ordinal))
+
+    def counts(self):
+        """Image counts by status."""
+        with self._lock:
+            return dict(self._db.execute('SELECT status, COUNT(*) FROM images GROUP BY status').fetchall())
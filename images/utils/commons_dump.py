@@ -0,0 +1,206 @@
+"""
+Offline import of Wikimedia Commons image records from SQL dumps.
+
+Reads the gzipped page, categorylinks and image table dumps from
+dumps.wikimedia.org (commonswiki-*-page.sql.gz and so on) one INSERT line at
+a time, so memory is bounded by the files selected, not by the dumps. The
+categorylinks dump selects the files in the target categories (and, with
+depth, their subcategories), the page dump turns their ids into titles and
+the image dump supplies size and dimensions. Records have the shape
+utils.wikimedia.fetch_category_images produces. License, artist and
+description live in the file pages' wikitext rather than these tables and
+are left empty; image_records can fill them for the files that need them.
+
+Newer dumps identify categories by cl_target_id; those also need the
+linktarget dump to resolve category names.
+"""
+import os
+import re
+import gzip
+import hashlib
+from urllib.parse import quote
+
+UPLOAD_URL = "https://upload.wikimedia.org/wikipedia/commons"
+FILE_PAGE = "https://commons.wikimedia.org/wiki/File:"
+
+# Characters MediaWiki leaves unescaped in URLs (wfUrlencode)
+URL_SAFE = ";@$!*(),/~:"
+
+NS_FILE = 6
+NS_CATEGORY = 14
+
+DUMP_FILES = {
+    'page': 'commonswiki-latest-page.sql.gz',
+    'categorylinks': 'commonswiki-latest-categorylinks.sql.gz',
+    'image': 'commonswiki-latest-image.sql.gz',
+    'linktarget': 'commonswiki-latest-linktarget.sql.gz',
+}
+
+# A VALUES tuple, and one value in it: a quoted string or a bare token
+_ROW = re.compile(r"\(((?:'(?:[^'\\]|\\.)*'|[^'()])*)\)")
+_FIELD = re.compile(r"'((?:[^'\\]|\\.)*)'|([^,']+)")
+_ESCAPE = re.compile(r"\\(.)")
+_ESCAPES = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+_COLUMN = re.compile(r"^\s*`(\w+)`")
+
+
+def _unescape(value):
+    if '\\' not in value:
+        return value
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _value(quoted, bare):
+    if bare:
+        return None if bare == 'NULL' else bare
+    return _unescape(quoted)
+
+
+def _open(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def dump_columns(path):
+    """Column names from a SQL dump's CREATE TABLE statement."""
+    names = []
+    with _open(path) as f:
+        for line in f:
+            if line.startswith('INSERT INTO'):
+                break
+            match = _COLUMN.match(line)
+            if match:
+                names.append(match.group(1))
+    return names
+
+
+def iter_rows(path, columns, contains=None):
+    """Yield tuples of the named columns for every row of a SQL dump.
+
+    Column positions come from the dump's CREATE TABLE statement. With
+    contains, INSERT lines holding none of those strings are skipped
+    without being parsed.
+    """
+    index = None
+    with _open(path) as f:
+        for line in f:
+            if not line.startswith('INSERT INTO'):
+                continue
+            if contains is not None and not any(s in line for s in contains):
+                continue
+            if index is None:
+                names = dump_columns(path)
+                missing = [c for c in columns if c not in names]
+                if missing:
+                    raise ValueError(f"{path} has no column {', '.join(missing)}")
+                index = [names.index(c) for c in columns]
+            for match in _ROW.finditer(line, line.index(' VALUES ') + 8):
+                fields = _FIELD.findall(match.group(1))
+                yield tuple(_value(*fields[i]) for i in index)
+
+
+def _quoted(name):
+    """name as it appears inside a quoted SQL string."""
+    return "'" + name.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _category_ids(categories, paths):
+    """{linktarget id: category name} for categories, from the linktarget dump."""
+    if not paths.get('linktarget'):
+        raise ValueError("categorylinks dump has no cl_to; the linktarget dump is needed")
+    ids = {}
+    rows = iter_rows(paths['linktarget'], ['lt_id', 'lt_namespace', 'lt_title'],
+                     contains=[_quoted(c) for c in categories])
+    for lt_id, namespace, title in rows:
+        if int(namespace) == NS_CATEGORY and title in categories:
+            ids[lt_id] = title
+    return ids
+
+
+def _members(categories, paths):
+    """({file page id: category}, {subcategory page id: category}) for categories."""
+    members = {'file': {}, 'subcat': {}}
+    if 'cl_to' in dump_columns(paths['categorylinks']):
+        rows = iter_rows(paths['categorylinks'], ['cl_from', 'cl_to', 'cl_type'],
+                         contains=[_quoted(c) for c in categories])
+        targets = {c: c for c in categories}
+    else:
+        rows = iter_rows(paths['categorylinks'], ['cl_from', 'cl_target_id', 'cl_type'])
+        targets = _category_ids(categories, paths)
+    for page_id, target, kind in rows:
+        category = targets.get(target)
+        if category is not None and kind in members:
+            members[kind].setdefault(page_id, category)
+    return members['file'], members['subcat']
+
+
+def _titles(ids, namespace, paths):
+    """{page id: title} for the ids in one namespace, from the page dump."""
+    titles = {}
+    for page_id, ns, title in iter_rows(paths['page'], ['page_id', 'page_namespace', 'page_title']):
+        if page_id in ids and int(ns) == namespace:
+            titles[page_id] = title
+    return titles
+
+
+def file_url(name):
+    """upload.wikimedia.org URL of a Commons file (name with underscores)."""
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return f"{UPLOAD_URL}/{digest[0]}/{digest[:2]}/{quote(name, safe=URL_SAFE)}"
+
+
+def dump_paths(directory, **overrides):
+    """Paths of the dump files in directory; missing optional dumps are None."""
+    paths = {}
+    for table, filename in DUMP_FILES.items():
+        path = overrides.get(table) or os.path.join(directory, filename)
+        paths[table] = path if os.path.exists(path) else None
+    for table in ('page', 'categorylinks', 'image'):
+        if not paths[table]:
+            raise FileNotFoundError(f"No {table} dump in {directory}")
+    return paths
+
+
+def import_records(paths, categories, depth=0):
+    """Yield image records for the files in categories and depth levels below.
+
+    Each subcategory level costs one more pass over categorylinks and page.
+    """
+    wanted = set(c.replace(' ', '_') for c in categories)
+    seen = set(wanted)
+    files = {}
+    for level in range(depth + 1):
+        level_files, subcats = _members(wanted, paths)
+        for page_id, category in level_files.items():
+            files.setdefault(page_id, category)
+        if level == depth or not subcats:
+            break
+        names = set(_titles(subcats, NS_CATEGORY, paths).values())
+        wanted = names - seen
+        seen |= wanted
+        if not wanted:
+            break
+
+    # Image names are file titles; map them to their category
+    by_name = {title: files[page_id] for page_id, title in _titles(files, NS_FILE, paths).items()}
+    del files
+    rows = iter_rows(paths['image'], ['img_name', 'img_width', 'img_height', 'img_size'])
+    for name, width, height, size in rows:
+        category = by_name.get(name)
+        if category is None:
+            continue
+        url = file_url(name)
+        yield {
+            'url': url,
+            'page_url': FILE_PAGE + quote(name, safe=URL_SAFE),
+            'title': name.replace('_', ' '),
+            'description': '',
+            'license': '',
+            'artist': '',
+            'category': category,
+            'original_url': url,
+            'width': int(width) if width else None,
+            'height': int(height) if height else None,
+            'size': int(size) if size else None,
+        }
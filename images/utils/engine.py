@@ -0,0 +1,277 @@
+"""
+asyncio crawl-and-download engine for the image extractors.
+
+A source plugs in as a Source adapter built from its own discover, extract and
+download callables. The stages are connected by bounded queues: pages are
+extracted while discovery is still running, and images are downloaded as soon
+as their page is parsed. A full queue pauses the stage feeding it, so memory
+stays flat however many images a source yields. The engine caps how many calls
+run against any single host, lowered further while the adaptive limits have
+backed a host off; the per-host token buckets in rate_limited_request still
+decide when each request may start.
+
+A source that splits extraction into fetch and parse has its pages fetched on
+the I/O threads and parsed in a process pool sized to the cores, so parsing
+scales with the CPU while the fetchers keep the network busy.
+
+With a CrawlState the engine checkpoints as it goes: the discovered pages,
+each visited page's images and every download outcome. A rerun after an
+interruption replays finished pages and images from the checkpoint instead of
+fetching them again.
+"""
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .ratelimit import host_of
+from . import adaptive_limits, share_host_limits, crawl_state, IndexWriter
+
+MAX_IN_FLIGHT = 16      # blocking calls running at once across all hosts
+PER_HOST = 4            # blocking calls running at once against one host
+PAGE_WINDOW = 8         # pages being extracted ahead of the download stage
+IMAGE_BUFFER = 64       # extracted images waiting for a download worker
+PARSE_WORKERS = os.cpu_count() or 1     # processes parsing fetched pages
+
+# forkserver where the platform has it (not Windows), spawn otherwise
+PARSE_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+_DONE = object()
+
+
+class _HostSlot:
+    """Async semaphore whose size is read again whenever a call waits for it."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.active < max(1, self.limit()))
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+
+class Source:
+    """Adapter describing how to crawl one image source.
+
+    discover() returns or yields the pages to visit (dicts with a 'url' key),
+    extract(page) returns the image dicts found on a page, and
+    download(img, index) returns True, False, or None when the image is skipped.
+
+    Optionally fetch(page) returns a page's HTML and parse(page, html) its
+    images; the engine then parses in worker processes, so parse must be a
+    module-level function. extract(page) is still used when no pool runs.
+    An ImageFilter as filter drops junk candidates before they are downloaded.
+    """
+
+    def __init__(self, name, discover, extract, download, per_host=None, fetch=None, parse=None,
+                 filter=None):
+        self.name = name
+        self.discover = discover
+        self.extract = extract
+        self.download = download
+        self.per_host = per_host
+        self.fetch = fetch
+        self.parse = parse
+        self.filter = filter
+
+
+class CrawlEngine:
+    """Streams a Source's pages through extraction and download."""
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, per_host=PER_HOST,
+                 page_window=PAGE_WINDOW, image_buffer=IMAGE_BUFFER, parse_workers=PARSE_WORKERS,
+                 host_limit=None):
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.page_window = page_window
+        self.image_buffer = image_buffer
+        self.parse_workers = parse_workers
+        self.host_limit = host_limit or adaptive_limits.concurrency
+        self._executor = None
+        self._parse_pool = None
+        self._host_slots = {}
+
+    def run(self, source, sink=None, state=None):
+        """Crawl a source to completion and return its result summary.
+
+        sink(img, outcome) is called for every image once its download
+        finishes; state is an optional CrawlState to checkpoint into.
+        """
+        share_host_limits()
+        return asyncio.run(self.crawl(source, sink, state))
+
+    async def crawl(self, source, sink=None, state=None):
+        """Discover, extract and download everything a source yields."""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        if source.fetch and source.parse and self.parse_workers:
+            # Forking this process, with its I/O threads and open sessions,
+            # could copy a held lock into the children; start them clean
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=PARSE_CONTEXT)
+        self._host_slots = {}
+        result = {'source': source.name, 'pages': 0, 'found': 0, 'downloaded': 0,
+                  'failed': 0, 'skipped': 0, 'filtered': 0, 'resumed': 0, 'errors': 0}
+        pages = asyncio.Queue(maxsize=self.page_window)
+        images = asyncio.Queue(maxsize=self.image_buffer)
+        if state:
+            state.begin()
+        workers = [asyncio.create_task(self._download_worker(source, images, result, sink, state))
+                   for _ in range(self.max_in_flight)]
+        try:
+            await asyncio.gather(
+                self._discover_stage(source, pages, result, state),
+                self._order_stage(pages, images, result),
+            )
+            for _ in workers:
+                await images.put(_DONE)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            if self._parse_pool:
+                self._parse_pool.shutdown(wait=True)
+                self._parse_pool = None
+        if state and not result['errors']:
+            state.finish()
+        if source.filter:
+            result['filter_hits'] = source.filter.report()
+        return result
+
+    async def _discover_stage(self, source, pages, result, state):
+        """Start extracting each page as soon as discovery yields it."""
+        loop = asyncio.get_running_loop()
+        replay = state is not None and state.discovery_complete()
+        try:
+            if replay:
+                found = iter(state.pages())
+            else:
+                found = await self._call(None, source, lambda: iter(source.discover()))
+            while True:
+                page = await loop.run_in_executor(self._executor, next, found, _DONE)
+                if page is _DONE:
+                    break
+                if state and not replay:
+                    state.add_page(page)
+                result['pages'] += 1
+                await pages.put(asyncio.create_task(self._extract(source, page, result, state)))
+            if state and not replay:
+                state.mark_discovered()
+        except Exception as e:
+            result['errors'] += 1
+            print(f"    Error discovering {source.name} pages: {e}")
+        finally:
+            await pages.put(_DONE)
+
+    async def _order_stage(self, pages, images, result):
+        """Hand extracted images to the download stage in page order."""
+        while True:
+            task = await pages.get()
+            if task is _DONE:
+                break
+            page_url, found = await task
+            for ordinal, img in enumerate(found):
+                await images.put((result['found'], img, page_url, ordinal))
+                result['found'] += 1
+
+    async def _download_worker(self, source, images, result, sink, state):
+        while True:
+            item = await images.get()
+            if item is _DONE:
+                break
+            index, img, page_url, ordinal = item
+            if source.filter and not source.filter.allows(img):
+                # Junk is neither downloaded nor handed to the sink (the index)
+                result['filtered'] += 1
+                continue
+            outcome = state.image_outcome(page_url, ordinal) if state else 'pending'
+            if outcome == 'pending':
+                outcome = await self._download(source, img, index)
+                if state:
+                    state.mark_image(page_url, ordinal, outcome)
+                if outcome is False:
+                    # Leave the checkpoint open so the next run retries it
+                    result['errors'] += 1
+            else:
+                result['resumed'] += 1
+            key = 'downloaded' if outcome is True else 'skipped' if outcome is None else 'failed'
+            result[key] += 1
+            if sink:
+                sink(img, outcome)
+
+    async def _extract(self, source, page, result, state):
+        """Images on a page, from the checkpoint if it was visited before."""
+        url = page.get('url', '')
+        if state and state.page_done(url):
+            return url, state.page_images(url)
+        try:
+            if self._parse_pool:
+                html = await self._call(url, source, source.fetch, page)
+                loop = asyncio.get_running_loop()
+                found = await loop.run_in_executor(self._parse_pool, source.parse, page, html) or []
+            else:
+                found = await self._call(url, source, source.extract, page) or []
+        except Exception as e:
+            result['errors'] += 1
+            print(f"    Error extracting {url}: {e}")
+            return url, []
+        if state:
+            state.save_page(page, found)
+        return url, found
+
+    async def _download(self, source, img, index):
+        try:
+            return await self._call(img.get('url'), source, source.download, img, index)
+        except Exception as e:
+            print(f"    Error downloading {img.get('url', '')}: {e}")
+            return False
+
+    def _slot(self, url, source):
+        host = host_of(url) if url else ''
+        slot = self._host_slots.get(host)
+        if slot is None:
+            ceiling = source.per_host or self.per_host
+            if host:
+                limit = lambda: min(ceiling, self.host_limit(host))
+            else:
+                limit = lambda: ceiling
+            slot = _HostSlot(limit)
+            self._host_slots[host] = slot
+        return slot
+
+    async def _call(self, url, source, func, *args):
+        loop = asyncio.get_running_loop()
+        async with self._slot(url, source):
+            return await loop.run_in_executor(self._executor, func, *args)
+
+
+def run_extractor(source, index_path, /, key='images', engine=None, state=None, **header):
+    """Crawl source with a checkpoint, streaming its images into an index file.
+
+    header fields (source, url, license, ...) open the index and the totals
+    close it; images the source's filter drops are left out of both. state
+    defaults to the source's own checkpoint. Prints the run summary and
+    returns the engine's result.
+    """
+    engine = engine or CrawlEngine()
+    with IndexWriter(index_path, key=key, **header) as index:
+        result = engine.run(source, sink=lambda img, outcome: index.add(img),
+                            state=state or crawl_state(source.name))
+        kept = result['found'] - result['filtered']
+        index.close(**{f'total_{key}': kept}, downloaded=result['downloaded'],
+                    failed=result['failed'], skipped=result['skipped'])
+    
+    print(f"\n[2] Downloaded {result['downloaded']}/{kept} images "
+          f"({result['failed']} failed, {result['skipped']} skipped)")
+    if source.filter:
+        print(f"    Filtered before fetching: {result['filtered']} {result['filter_hits']}")
+    print(f"    Index saved: {index_path}")
+    return result
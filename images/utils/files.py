@@ -0,0 +1,240 @@
+"""
+Resumable partial downloads, atomic file writes and a registry of hashes
+computed while downloading.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: partial files are not locked
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+class HashingWriter:
+    """Writes a download to a partial file beside the destination, hashing as it goes.
+
+    The partial file is named after the destination and the URL, so a later
+    attempt at the same download finds it and can resume; its progress is
+    kept in a small JSON sidecar. If another writer holds the partial, this
+    one falls back to a private temp file that cannot be resumed.
+    """
+
+    def __init__(self, dest_path, url):
+        self.dest_path = dest_path
+        self.url = url
+        directory = os.path.dirname(dest_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        prefix = '.' + os.path.basename(dest_path)[:100] + '.'
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]
+        self.tmp_path = os.path.join(directory, f"{prefix}{key}.part")
+        self.progress_path = self.tmp_path + '.json'
+        self._file = open(self.tmp_path, 'ab')
+        if not _try_lock(self._file):
+            self._file.close()
+            fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix='.part')
+            self.progress_path = None
+            self._file = os.fdopen(fd, 'wb')
+        self.validators = {}
+        self.expected_total = None
+        self.md5 = hashlib.md5()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def resume_offset(self):
+        """Bytes kept from an earlier attempt at this URL, or 0."""
+        if not self.progress_path:
+            return 0
+        try:
+            with open(self.progress_path) as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        # Without a validator the kept bytes could belong to an older version
+        if progress.get('url') != self.url or not progress.get('validators'):
+            return 0
+        self.validators = progress['validators']
+        self.expected_total = progress.get('total')
+        return os.path.getsize(self.tmp_path)
+
+    def start(self, offset=0):
+        """Prepare to write from offset, re-hashing the bytes kept before it."""
+        self._file.truncate(offset)
+        self.md5 = hashlib.md5()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        if offset:
+            with open(self.tmp_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    self.md5.update(chunk)
+                    self.sha256.update(chunk)
+                    self.size += len(chunk)
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.md5.update(chunk)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+
+    def save_progress(self, total=None):
+        """Flush and record how far the download got."""
+        if self.progress_path and not self._file.closed:
+            self._file.flush()
+            write_json_atomic(self.progress_path, {
+                'url': self.url,
+                'validators': self.validators,
+                'bytes': self.size,
+                'total': total,
+            })
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def suspend(self, total=None):
+        """Keep the partial file and its progress for a later resume.
+
+        Only a partial whose server sent an ETag or Last-Modified is kept; it
+        is the only kind a Range request with If-Range can safely extend.
+        """
+        if self.size and self.validators:
+            self.save_progress(total)
+        if (self.validators and self.progress_path and os.path.exists(self.progress_path)
+                and os.path.getsize(self.tmp_path)):
+            self.close()
+        else:
+            self.discard()
+
+    def finish(self):
+        """Close the completed file; its progress record is no longer needed."""
+        self.close()
+        if self.progress_path and os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+
+    def discard(self):
+        """Close and delete the partial file and its progress."""
+        self._file.close()
+        for path in (self.tmp_path, self.progress_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+
+def commit_file(tmp_path, dest_path, sha256, owner=None, keep_source=False):
+    """Move a finished temp file into place without clobbering another writer.
+
+    The file lands under dest_path unless that name already holds different
+    content from a different owner (the URL it was downloaded from); then it
+    gets a short content-hash suffix instead. With keep_source the source is
+    hard-linked and left where it is. Returns the final path.
+    """
+    stem, ext = os.path.splitext(dest_path)
+    candidates = [dest_path, f"{stem}_{sha256[:8]}{ext}"]
+    for path in candidates:
+        try:
+            os.link(tmp_path, path)
+            if not keep_source:
+                os.remove(tmp_path)
+            return path
+        except FileExistsError:
+            if _sha256_of(path) == sha256:
+                if not keep_source:
+                    os.remove(tmp_path)
+                return path
+            if owner and _owner_of(path) == owner:
+                _replace(tmp_path, path, keep_source)
+                return path
+        except OSError:
+            # Filesystem without hard links
+            if keep_source:
+                raise
+            if not os.path.exists(path):
+                os.replace(tmp_path, path)
+                return path
+    _replace(tmp_path, candidates[-1], keep_source)
+    return candidates[-1]
+
+
+def _replace(src, path, keep_source):
+    """Atomically put src at path, linking it first when src must stay."""
+    if keep_source:
+        tmp_link = f"{path}.{os.getpid()}.{threading.get_ident()}.link"
+        os.link(src, tmp_link)
+        src = tmp_link
+    os.replace(src, path)
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it over path."""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path)[:100] + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def record_hashes(path, md5, sha256):
+    """Remember the hashes of a file just written."""
+    stat = os.stat(path)
+    with _hashes_lock:
+        _hashes[(stat.st_dev, stat.st_ino)] = (stat.st_size, stat.st_mtime_ns, md5, sha256)
+
+
+def known_hashes(path):
+    """Return (md5, sha256) for a file written by this process, if unchanged since.
+
+    Entries are keyed by inode, so hard links to a stored blob share them.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _hashes_lock:
+        entry = _hashes.get((stat.st_dev, stat.st_ino))
+    if entry and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+        return entry[2], entry[3]
+    return None
+
+
+def _try_lock(f):
+    """Take an exclusive non-blocking lock on an open file."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _sha256_of(path):
+    known = known_hashes(path)
+    if known:
+        return known[1]
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _owner_of(path):
+    try:
+        with open(path + '.json') as f:
+            return json.load(f).get('original_url')
+    except (OSError, ValueError, AttributeError):
+        return None
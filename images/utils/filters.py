@@ -0,0 +1,105 @@
+"""
+Pre-fetch filtering of image candidates.
+
+Pages list plenty of images that are not content: tracking pixels, spacers,
+loaders, logos and navigation icons, often the same ones on every page. An
+ImageFilter drops them before any request is made, using the declared width
+and height from the <img> tag, host and path rules compiled into one regular
+expression each, a list of tracker domains, and the URLs already seen this
+run. It counts how often each rule fired.
+"""
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+from .frontier import SeenURLs
+
+# Ad, analytics and tracking-pixel domains (subdomains included)
+TRACKER_DOMAINS = [
+    'contextweb.com', 'doubleclick.net', 'googlesyndication.com',
+    'google-analytics.com', 'googletagmanager.com', 'googleadservices.com',
+    'adnxs.com', 'pubmatic.com', 'rubiconproject.com', 'criteo.com',
+    'criteo.net', 'casalemedia.com', 'openx.net', 'taboola.com', 'outbrain.com',
+    'scorecardresearch.com', 'quantserve.com', 'amazon-adsystem.com',
+    'facebook.com', 'facebook.net', 'moatads.com', 'adsrvr.org', '3lift.com',
+]
+
+# Path fragments of site chrome rather than content
+SKIP_PATTERNS = ['icon', 'logo', 'button', 'nav', 'spacer', 'banner', 'sprite', 'loader', 'bullet']
+
+MIN_WIDTH = 50
+MIN_HEIGHT = 50
+MAX_ASPECT = 10     # wider or taller than this ratio is a rule or spacer; None for no limit
+
+
+def _compile(patterns):
+    if not patterns:
+        return None
+    return re.compile('|'.join(re.escape(p.lower()) for p in patterns))
+
+
+def declared_size(value):
+    """Pixels from a width/height attribute ('120', '120px'), or None."""
+    match = re.match(r'\s*(\d+)\s*(px)?\s*$', str(value or ''))
+    return int(match.group(1)) if match else None
+
+
+class ImageFilter:
+    """Drops junk image candidates before they are fetched.
+
+    Candidates are the image dicts the extractors produce: 'url', plus the
+    <img> tag's own 'thumbnail' src and declared 'width' and 'height' when
+    known.
+    """
+
+    def __init__(self, skip_patterns=SKIP_PATTERNS, skip_hosts=(), tracker_domains=TRACKER_DOMAINS,
+                 min_width=MIN_WIDTH, min_height=MIN_HEIGHT, max_aspect=MAX_ASPECT, skip_repeats=True):
+        self._path = _compile(skip_patterns)
+        domains = list(tracker_domains) + list(skip_hosts)
+        self._hosts = re.compile(r'(^|\.)(%s)$' % '|'.join(re.escape(d.lower()) for d in domains)) if domains else None
+        self._trackers = set(d.lower() for d in tracker_domains)
+        self.min_width = min_width
+        self.min_height = min_height
+        self.max_aspect = max_aspect
+        self._seen = SeenURLs() if skip_repeats else None
+        self.hits = Counter()
+        self._lock = threading.Lock()
+
+    def rule_for(self, img):
+        """Name of the rule that rejects img, or None to keep it."""
+        url = img.get('url') or ''
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        if self._hosts and host:
+            match = self._hosts.search(host)
+            if match:
+                return 'tracker' if match.group(2) in self._trackers else 'host'
+        if self._path:
+            # Chrome is recognised by the <img src> shown on the page, not the
+            # full-size link an extractor may have swapped in for it
+            shown = urlsplit(img.get('thumbnail') or url)
+            if self._path.search((shown.path + '?' + shown.query).lower()):
+                return 'path'
+        width, height = declared_size(img.get('width')), declared_size(img.get('height'))
+        if width is not None and height is not None:
+            if width < self.min_width or height < self.min_height:
+                return 'too_small'
+            if self.max_aspect and max(width, height) > self.max_aspect * max(1, min(width, height)):
+                return 'aspect'
+        if self._seen is not None and url and not self._seen.add(url):
+            return 'repeat'
+        return None
+
+    def allows(self, img):
+        """True if img should be fetched; counts the rule that rejected it otherwise."""
+        rule = self.rule_for(img)
+        if rule is None:
+            return True
+        with self._lock:
+            self.hits[rule] += 1
+        return False
+
+    def report(self):
+        """Rule hit counts, most frequent first."""
+        with self._lock:
+            return dict(self.hits.most_common())
@@ -0,0 +1,148 @@
+"""
+Crawl frontier shared by the extractors.
+
+URLs are canonicalized before they are compared, so the same page reached
+through http and https, with a #fragment, with tracking parameters, or (on
+Wikimedia) as any /thumb/ rendition counts once. Seen URLs live in a hash set,
+or in a Bloom filter when a crawl is too large to keep every URL in memory.
+The frontier hands pages out by priority, then in the order they were added,
+and drops pages beyond its depth limit.
+"""
+import re
+import math
+import heapq
+import hashlib
+import itertools
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that never change what a page or image is
+NOISE_PARAMS = {
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref', 'sessionid', 'sid',
+    'phpsessid', 'jsessionid',
+}
+
+# upload.wikimedia.org/<project>/<lang>/thumb/a/ab/Name.jpg/220px-Name.jpg
+WIKIMEDIA_THUMB = re.compile(r'^(/[^/]+/[^/]+)/thumb(/[0-9a-f]/[0-9a-f]{2}/[^/]+)/[^/]+$')
+
+
+def canonicalize_url(url, base=None):
+    """Canonical form of url used to decide whether two URLs are the same."""
+    if base:
+        url = urljoin(base, url)
+    elif url.startswith('//'):
+        url = 'https:' + url
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if scheme == 'http':
+        scheme = 'https'
+    path = parts.path or '/'
+    if host == 'upload.wikimedia.org':
+        match = WIKIMEDIA_THUMB.match(path)
+        if match:
+            path = match.group(1) + match.group(2)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in NOISE_PARAMS)
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+class BloomFilter:
+    """Fixed-size set of strings with a bounded false-positive rate."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item):
+        for p in self._positions(item):
+            self._bits[p >> 3] |= 1 << (p & 7)
+
+
+class SeenURLs:
+    """Canonical URLs already seen; add() tells whether a URL is new.
+
+    With capacity set, a Bloom filter replaces the hash set; a small share of
+    new URLs may then be reported as seen, but memory stays fixed.
+    """
+
+    def __init__(self, capacity=None, error_rate=0.001):
+        self._seen = BloomFilter(capacity, error_rate) if capacity else set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self._seen
+
+    def add(self, url):
+        """Record url; True if it had not been seen before."""
+        key = canonicalize_url(url)
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            return True
+
+
+class Frontier:
+    """Pages waiting to be crawled, deduplicated by canonical URL.
+
+    Pages come out lowest priority value first and in insertion order within
+    a priority. Pages deeper than max_depth, or added once max_pages have been
+    accepted, are dropped.
+    """
+
+    def __init__(self, max_depth=None, max_pages=None, capacity=None):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.seen = SeenURLs(capacity)
+        self.accepted = 0
+        self._heap = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, url, priority=0, depth=0, **data):
+        """Queue a page unless it was seen or is out of bounds; True if queued."""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        with self._lock:
+            if self.max_pages is not None and self.accepted >= self.max_pages:
+                return False
+            if not self.seen.add(url):
+                return False
+            self.accepted += 1
+            page = dict(data, url=url, depth=depth)
+            heapq.heappush(self._heap, (priority, next(self._order), page))
+        return True
+
+    def pop(self):
+        """Next page to crawl, or None when the frontier is empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[2]
+
+    def drain(self):
+        """Yield pages until the frontier is empty, including ones added meanwhile."""
+        while True:
+            page = self.pop()
+            if page is None:
+                return
+            yield page
+
+    def __len__(self):
+        return len(self._heap)
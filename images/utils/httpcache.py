@@ -0,0 +1,168 @@
+"""
+On-disk HTTP cache driven by conditional requests.
+
+Pages and API responses are stored with their ETag / Last-Modified
+validators. The next request for the same URL sends If-None-Match and
+If-Modified-Since, and a 304 reply is answered from the stored body. Image
+entries keep only validators plus the SHA-256 of the stored blob, since the
+body already lives in the content store. Entries are evicted by age and, when
+the cache grows past its size budget, least recently used first.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlencode
+import requests
+from .files import write_json_atomic
+
+MAX_BYTES = 512 * 1024 * 1024
+MAX_AGE = 90 * 24 * 3600
+PRUNE_EVERY = 200   # stores between eviction passes
+
+
+class HTTPCache:
+    """Validators and bodies keyed by URL and query parameters."""
+
+    def __init__(self, root, max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stores = 0
+
+    def key(self, url, params=None):
+        if params:
+            url = f"{url}?{urlencode(sorted(dict(params).items()), doseq=True)}"
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def get(self, key):
+        """The stored entry for key, or None."""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('has_body') and not os.path.exists(body_path):
+            return None
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since headers for a stored entry."""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key, response):
+        """Keep a 200 response's body and validators if it has any validators."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        tmp_body = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_body, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_body, body_path)
+        self._write(meta_path, {
+            'url': response.url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'has_body': True,
+        })
+
+    def remember(self, key, url, etag=None, last_modified=None, sha256=None):
+        """Keep only validators for a body stored elsewhere (e.g. a blob)."""
+        if not (etag or last_modified):
+            return
+        meta_path, _ = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        self._write(meta_path, {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'sha256': sha256,
+            'has_body': False,
+        })
+
+    def respond(self, key, entry, not_modified):
+        """Build a 200 response from the cache for a 304 reply."""
+        meta_path, body_path = self._paths(key)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry.get('url') or not_modified.url
+        response.headers.update(entry.get('headers') or {})
+        response.encoding = entry.get('encoding')
+        response.request = not_modified.request
+        with open(body_path, 'rb') as f:
+            response._content = f.read()
+        response.from_cache = True
+        self.touch(key)
+        return response
+
+    def touch(self, key):
+        """Mark an entry as just revalidated."""
+        meta_path, _ = self._paths(key)
+        now = time.time()
+        try:
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+
+    def _write(self, meta_path, entry):
+        entry['stored_at'] = time.time()
+        write_json_atomic(meta_path, entry)
+        with self._lock:
+            self._stores += 1
+            due = self._stores % PRUNE_EVERY == 1
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Evict entries past max_age, then the least recently used over max_bytes."""
+        entries = []
+        now = time.time()
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(directory, name)
+                body_path = meta_path[:-5] + '.body'
+                try:
+                    used = os.path.getmtime(meta_path)
+                    size = os.path.getsize(meta_path)
+                    if os.path.exists(body_path):
+                        size += os.path.getsize(body_path)
+                except OSError:
+                    continue
+                if now - used > self.max_age:
+                    self._evict(meta_path, body_path)
+                else:
+                    entries.append((used, size, meta_path, body_path))
+        total = sum(size for _, size, _, _ in entries)
+        for used, size, meta_path, body_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._evict(meta_path, body_path)
+            total -= size
+
+    @staticmethod
+    def _evict(meta_path, body_path):
+        for path in (meta_path, body_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,57 @@
+"""
+Incremental writer for extractor index files.
+"""
+import os
+import json
+
+
+class IndexWriter:
+    """Writes an index JSON file one image at a time.
+
+    Header fields are written first, images are appended as they arrive and
+    the totals are written on close, so the full image list never has to be
+    held in memory.
+    """
+
+    def __init__(self, path, key='images', **header):
+        self.path = path
+        self.key = key
+        self.header = header
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        os.makedirs(os.path.dirname(str(self.path)) or '.', exist_ok=True)
+        self._file = open(self.path, 'w')
+        self._file.write('{\n')
+        for name, value in self.header.items():
+            self._file.write(f'  {json.dumps(name)}: {self._dump(value)},\n')
+        self._file.write(f'  {json.dumps(self.key)}: [')
+
+    def add(self, item):
+        """Append one entry to the image list."""
+        self._file.write(',\n    ' if self.count else '\n    ')
+        self._file.write(self._dump(item, indent='    '))
+        self.count += 1
+
+    def close(self, **totals):
+        """Finish the image list, write the totals and close the file."""
+        if self._file is None:
+            return
+        self._file.write('\n  ]' if self.count else ']')
+        for name, value in totals.items():
+            self._file.write(f',\n  {json.dumps(name)}: {self._dump(value)}')
+        self._file.write('\n}\n')
+        self._file.close()
+        self._file = None
+
+    @staticmethod
+    def _dump(value, indent='  '):
+        return json.dumps(value, indent=2).replace('\n', '\n' + indent)
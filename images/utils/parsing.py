@@ -0,0 +1,73 @@
+"""
+HTML parsing for the extractors.
+
+make_soup parses with lxml when it is installed, which is several times faster
+than html.parser, and can keep only the tags an extractor reads. The two
+backends repair broken markup differently, so a PageParser checks its first
+pages against html.parser and, if the extracted results differ, drops back to
+html.parser for the rest of the run. check_parity runs the same comparison
+over saved pages (see extractors/check_parsers.py).
+"""
+import threading
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = 'html.parser'
+
+SAFE_PARSER = 'html.parser'
+VERIFY_PAGES = 5    # pages per run checked against html.parser
+
+# Every PageParser, so saved pages can be checked against all of them
+parsers = []
+
+
+def make_soup(html, only=None, parser=FAST_PARSER):
+    """Parse html, keeping only the given tag name(s) and their contents."""
+    return BeautifulSoup(html, parser, parse_only=SoupStrainer(only) if only else None)
+
+
+class PageParser:
+    """Runs extract(soup, url) over pages parsed with the fast backend.
+
+    only lists the tags extract reads; tags outside them (and outside their
+    subtrees) are not built. Leave it unset when extract walks parents or
+    neighbouring elements.
+    """
+
+    def __init__(self, extract, only=None, verify_pages=VERIFY_PAGES):
+        self.extract = extract
+        self.only = only
+        self.verify_pages = verify_pages
+        self.parser = FAST_PARSER
+        self.verified = 0
+        self._lock = threading.Lock()
+        parsers.append(self)
+
+    @property
+    def name(self):
+        return f"{self.extract.__module__}.{self.extract.__name__}"
+
+    def __call__(self, html, url):
+        if self.parser == SAFE_PARSER:
+            return self.extract(make_soup(html, parser=SAFE_PARSER), url)
+        with self._lock:
+            verify = self.verified < self.verify_pages
+            self.verified += verify
+        if not verify:
+            return self.extract(make_soup(html, self.only), url)
+        result, reference = check_parity(self, html, url)
+        if result != reference:
+            print(f"    {self.name}: {FAST_PARSER} output differs on {url}, using {SAFE_PARSER}")
+            self.parser = SAFE_PARSER
+            return reference
+        return result
+
+
+def check_parity(page_parser, html, url):
+    """What page_parser extracts from html with the fast setup and with html.parser."""
+    fast = page_parser.extract(make_soup(html, page_parser.only), url)
+    reference = page_parser.extract(make_soup(html, parser=SAFE_PARSER), url)
+    return fast, reference
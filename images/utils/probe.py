@@ -0,0 +1,100 @@
+"""
+Cheap pre-download probing of images.
+
+Before the full transfer, only the first PROBE_BYTES of an image are requested.
+Content-Type, the total size and the pixel dimensions read from the JPEG,
+PNG, GIF or WebP header are enough to skip icons, thumbnails, oversize files
+and HTML error pages. ProbeRules holds the thresholds for one source.
+"""
+import struct
+
+PROBE_BYTES = 4096
+
+MIN_WIDTH = 64
+MIN_HEIGHT = 64
+MIN_BYTES = 100
+MAX_BYTES = 50 * 1024 * 1024
+
+# JPEG start-of-frame markers (not DHT 0xC4, JPG 0xC8 or DAC 0xCC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_info(data):
+    """(format, width, height) from an image's leading bytes; unknowns are None."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR' and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return 'png', width, height
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        width, height = struct.unpack('<HH', data[6:10])
+        return 'gif', width, height
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return ('webp',) + _webp_size(data)
+    if data[:2] == b'\xff\xd8':
+        return ('jpeg',) + _jpeg_size(data)
+    return None, None, None
+
+
+def _webp_size(data):
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30 and data[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25 and data[20] == 0x2F:
+        bits = int.from_bytes(data[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+    return None, None
+
+
+def _jpeg_size(data):
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None, None
+        marker = data[i + 1]
+        if marker == 0xFF:          # fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker in _SOF_MARKERS:
+            if i + 9 > len(data):
+                break
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    # The frame header lies beyond the probed bytes (large EXIF blocks do that)
+    return None, None
+
+
+class ProbeRules:
+    """Thresholds deciding from a probe whether an image is worth downloading."""
+
+    def __init__(self, min_width=MIN_WIDTH, min_height=MIN_HEIGHT, min_bytes=MIN_BYTES, max_bytes=MAX_BYTES):
+        self.min_width = min_width
+        self.min_height = min_height
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+
+    def reject(self, info):
+        """Why the probed image should be skipped, or None to download it."""
+        content_type = info.get('content_type') or ''
+        head = (info.get('data') or b'')[:512].lstrip().lower()
+        if 'html' in content_type or head.startswith((b'<!doctype html', b'<html')):
+            return 'html page'
+        if not info.get('format') and not content_type.startswith('image/'):
+            return f"not an image ({content_type or 'unknown type'})"
+        length = info.get('length')
+        if length is not None and self.max_bytes and length > self.max_bytes:
+            return f"too large ({length} bytes)"
+        width, height = info.get('width'), info.get('height')
+        if width is not None and height is not None:
+            if width < self.min_width or height < self.min_height:
+                return f"too small ({width}x{height})"
+        elif length is not None and length < self.min_bytes:
+            # Without dimensions, a tiny body is a pixel or an error stub
+            return f"too small ({length} bytes)"
+        return None
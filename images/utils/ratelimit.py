@@ -0,0 +1,159 @@
+"""
+Per-host token-bucket rate limiting for the image extractors.
+
+Buckets normally live in the process. Once a limiter is shared through a
+directory, each host's bucket state is kept in a small file there and updated
+under an exclusive flock, so every extractor process on the machine draws
+from the same bucket for a host.
+"""
+import os
+import re
+import json
+import time
+import threading
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:     # no flock (Windows): buckets stay per process
+    fcntl = None
+
+# Same politeness as the old global limiter: one request per second per host
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 1
+DEFAULT_MIN_INTERVAL = 1.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket with a minimum gap between requests."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_interval=DEFAULT_MIN_INTERVAL):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.min_interval = float(min_interval)
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._last = float('-inf')
+
+    def reserve(self, cost=1):
+        """Claim the next slot for cost tokens and return how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start, self._tokens = self._take(now, self._tokens, self._stamp, self._last, cost)
+            self._stamp = self._last = start
+            return start - now
+
+    def _take(self, now, tokens, stamp, last, cost):
+        """Start time of the next slot and the tokens left after it."""
+        start = max(now, last + self.min_interval)
+        tokens = min(self.burst, tokens + max(0.0, start - stamp) * self.rate)
+        if tokens < cost:
+            start += (cost - tokens) / self.rate
+            tokens = float(cost)
+        return start, tokens - cost
+
+    def acquire(self, cost=1):
+        """Block until a request slot (or cost tokens) is available."""
+        wait = self.reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+
+    def update(self, rate=None, burst=None, min_interval=None):
+        """Change the bucket's limits in place."""
+        with self._lock:
+            if rate is not None:
+                self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(1, int(burst))
+                self._tokens = min(self._tokens, self.burst)
+            if min_interval is not None:
+                self.min_interval = float(min_interval)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket whose state is a flock-protected file shared between processes."""
+
+    def __init__(self, path, **limits):
+        super().__init__(**limits)
+        self.path = str(path)
+
+    def reserve(self, cost=1):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()   # wall clock: the stamps are compared across processes
+                try:
+                    tokens, stamp, last = json.loads(os.read(fd, 256))
+                except ValueError:
+                    tokens, stamp, last = float(self.burst), now, 0.0
+                start, tokens = self._take(now, tokens, stamp, last, cost)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, json.dumps([tokens, start, start]).encode())
+            finally:
+                os.close(fd)    # also releases the lock
+            return start - now
+
+
+class HostRateLimiter:
+    """One token bucket per host, created on first use."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_interval=DEFAULT_MIN_INTERVAL):
+        self.defaults = {'rate': rate, 'burst': burst, 'min_interval': min_interval}
+        self._config = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.state_dir = None
+
+    def share(self, directory):
+        """Keep bucket state in directory so all processes using it share each host's budget."""
+        if fcntl is None or self.state_dir == str(directory):
+            return
+        os.makedirs(str(directory), exist_ok=True)
+        with self._lock:
+            self.state_dir = str(directory)
+            self._buckets = {}
+
+    def configure(self, host, rate=None, burst=None, min_interval=None):
+        """Set the limits for a host, keeping defaults for anything not given."""
+        host = host.lower()
+        with self._lock:
+            config = dict(self.defaults, **self._config.get(host, {}))
+            for key, value in (('rate', rate), ('burst', burst), ('min_interval', min_interval)):
+                if value is not None:
+                    config[key] = value
+            self._config[host] = config
+            bucket = self._buckets.get(host)
+        if bucket:
+            bucket.update(**config)
+
+    def limits(self, host):
+        """Return the effective limits for a host."""
+        with self._lock:
+            return dict(self.defaults, **self._config.get(host.lower(), {}))
+
+    def bucket(self, host):
+        """Return the bucket for a host."""
+        host = host.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                limits = dict(self.defaults, **self._config.get(host, {}))
+                if self.state_dir:
+                    name = re.sub(r'[^a-z0-9.-]', '_', host or 'default') + '.json'
+                    bucket = SharedTokenBucket(os.path.join(self.state_dir, name), **limits)
+                else:
+                    bucket = TokenBucket(**limits)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        """Block until the host serving url may be contacted again."""
+        self.bucket(host_of(url)).acquire()
+
+
+def host_of(url):
+    """Return the lowercase host name of a URL."""
+    return (urlparse(url).hostname or '').lower()
@@ -0,0 +1,116 @@
+"""
+Retry policy and per-host circuit breakers for the shared HTTP layer.
+"""
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+# Responses worth retrying; anything else (404, 403, ...) is final
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that honors Retry-After."""
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=60.0, max_retry_after=300.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt + 1."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            return max(backoff, min(retry_after, self.max_retry_after))
+        return backoff
+
+
+class CircuitBreaker:
+    """Pauses one host after repeated failures instead of hammering it.
+
+    After threshold consecutive failures the breaker opens and every request
+    to the host waits out the cooldown. Then a single probe request is let
+    through: success closes the breaker, failure opens it again for twice as
+    long (up to max_cooldown).
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=600.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    @property
+    def is_open(self):
+        return self.open_until > time.monotonic()
+
+    def before_request(self):
+        """Block while the host is paused; only one probe runs after a pause."""
+        with self._cond:
+            while True:
+                wait = self.open_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self._probing:
+                    self._cond.wait()
+                else:
+                    if self.failures >= self.threshold:
+                        self._probing = True
+                    return
+
+    def record_success(self):
+        with self._cond:
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._probing = False
+            self._cond.notify_all()
+
+    def record_failure(self, hold=None):
+        """Count a failure; hold pauses the host for that long regardless."""
+        with self._cond:
+            self.failures += 1
+            now = time.monotonic()
+            if self._probing or self.failures == self.threshold:
+                self.open_until = max(self.open_until, now + self.cooldown)
+                if self._probing:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            if hold:
+                self.open_until = max(self.open_until, now + hold)
+            self._probing = False
+            self._cond.notify_all()
+
+
+class HostBreakers:
+    """One circuit breaker per host, created on first use."""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(**self.settings)
+                self._breakers[host] = breaker
+            return breaker
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
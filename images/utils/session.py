@@ -0,0 +1,121 @@
+"""
+Shared keep-alive HTTP session with per-host connection pools.
+"""
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'MedicalImageBot/1.0 (Educational/Research Purpose)'
+TIMEOUT = 30
+
+# Connection pooling - urllib3 keeps one pool per host
+POOL_CONNECTIONS = 20   # host pools kept alive at once
+POOL_MAXSIZE = 4        # keep-alive connections per host
+DNS_CACHE_TTL = 300     # seconds; 0 disables the resolver cache
+
+_session = None
+_session_lock = threading.Lock()
+_host_pools = {}
+_pool_defaults = {'pool_connections': POOL_CONNECTIONS, 'pool_maxsize': POOL_MAXSIZE}
+
+
+class DNSCache:
+    """Caches socket.getaddrinfo results for a fixed time."""
+
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._resolve = None
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        key = (host, port, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+        result = self._resolve(host, port, *args, **kwargs)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+        return result
+
+    def install(self):
+        """Route socket.getaddrinfo through the cache."""
+        if self._resolve is None:
+            self._resolve = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        """Restore the original resolver."""
+        if self._resolve is not None:
+            socket.getaddrinfo = self._resolve
+            self._resolve = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dns_cache = DNSCache()
+
+
+def _mount(session, prefix, pool_maxsize):
+    adapter = HTTPAdapter(pool_connections=_pool_defaults['pool_connections'],
+                          pool_maxsize=pool_maxsize)
+    session.mount(prefix, adapter)
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    for prefix in ('https://', 'http://'):
+        _mount(session, prefix, _pool_defaults['pool_maxsize'])
+    for host, size in _host_pools.items():
+        for scheme in ('https://', 'http://'):
+            _mount(session, f"{scheme}{host}/", size)
+    if DNS_CACHE_TTL > 0:
+        dns_cache.ttl = DNS_CACHE_TTL
+        dns_cache.install()
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def configure_pools(pool_connections=None, pool_maxsize=None):
+    """Change the default pool sizes; takes effect on the next session."""
+    with _session_lock:
+        if pool_connections is not None:
+            _pool_defaults['pool_connections'] = pool_connections
+        if pool_maxsize is not None:
+            _pool_defaults['pool_maxsize'] = pool_maxsize
+    close_session()
+
+
+def configure_host_pool(host, pool_maxsize):
+    """Give one host its own keep-alive pool size."""
+    host = host.lower()
+    with _session_lock:
+        _host_pools[host] = pool_maxsize
+        if _session is not None:
+            for scheme in ('https://', 'http://'):
+                _mount(_session, f"{scheme}{host}/", pool_maxsize)
+
+
+def close_session():
+    """Close pooled connections; the next request opens a fresh session."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
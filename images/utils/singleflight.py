@@ -0,0 +1,51 @@
+"""
+Request coalescing for concurrent callers.
+
+Several pages, categories and sources lead to the same URLs, and with many
+workers two of them often ask for one URL at the same moment. A SingleFlight
+lets the first caller for a key do the work while later callers for the same
+key wait and receive its result (or its exception) instead of repeating the
+request. Once the call finishes, the next caller for that key starts afresh.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """One call in flight per key; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Return func(*args, **kwargs), or the result of the same key's call already running."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,107 @@
+"""
+Content-addressed image store.
+
+Every downloaded body is kept once under store/<aa>/<bb>/<sha256>, sharded by
+hash prefix. The human-readable category paths the extractors choose are hard
+links to those blobs, and catalog.jsonl records which URL and which paths
+point at each blob. A URL whose blob is already stored is never fetched again.
+"""
+import os
+import json
+import threading
+from .files import commit_file
+
+
+class ContentStore:
+    """Blobs keyed by SHA-256 plus a catalog of the URLs and paths pointing at them."""
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.catalog_path = os.path.join(self.root, 'catalog.jsonl')
+        self._lock = threading.Lock()
+        self._by_url = None
+        self._entries = None
+
+    def blob_path(self, sha256):
+        """Sharded location of a blob."""
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def has(self, sha256):
+        return os.path.exists(self.blob_path(sha256))
+
+    def lookup(self, url):
+        """SHA-256 of the blob last stored for url, if it is still present."""
+        self._load()
+        with self._lock:
+            sha256 = self._by_url.get(url)
+        if sha256 and self.has(sha256):
+            return sha256
+        return None
+
+    def add(self, tmp_path, sha256):
+        """Move a finished download into the store; a known blob just drops it."""
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(tmp_path, blob)
+        return blob
+
+    def place(self, sha256, dest_path, url=None):
+        """Make dest_path point at a blob and record it; returns the final path.
+
+        dest_path becomes a hard link to the blob. If the filesystem cannot
+        link, the catalog entry alone maps the path to its blob.
+        """
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        try:
+            final_path = commit_file(blob, dest_path, sha256, owner=url, keep_source=True)
+        except OSError:
+            final_path = dest_path
+        self.record(sha256, final_path, url)
+        return final_path
+
+    def record(self, sha256, path, url=None):
+        """Append a catalog entry unless it is already known."""
+        self._load()
+        entry = (url, sha256, os.path.abspath(path))
+        with self._lock:
+            if entry in self._entries:
+                return
+            self._entries.add(entry)
+            if url:
+                self._by_url[url] = sha256
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.catalog_path, 'a') as f:
+                f.write(json.dumps({'url': url, 'sha256': sha256, 'path': entry[2]}) + '\n')
+
+    def resolve(self, path):
+        """Blob path for a catalogued category path, or None."""
+        self._load()
+        path = os.path.abspath(path)
+        with self._lock:
+            for url, sha256, known in self._entries:
+                if known == path:
+                    return self.blob_path(sha256)
+        return None
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        with self._lock:
+            if self._entries is not None:
+                return
+            by_url, entries = {}, set()
+            if os.path.exists(self.catalog_path):
+                with open(self.catalog_path) as f:
+                    for line in f:
+                        try:
+                            item = json.loads(line)
+                        except ValueError:
+                            continue
+                        entries.add((item.get('url'), item['sha256'], item['path']))
+                        if item.get('url'):
+                            by_url[item['url']] = item['sha256']
+            self._by_url, self._entries = by_url, entries
@@ -0,0 +1,213 @@
+"""
+Wikimedia Commons API helpers shared by the Commons extractors.
+
+Files are listed with list=categorymembers (up to 500 titles per call) and
+then resolved in batches with prop=imageinfo, so a category costs a handful
+of API calls instead of one HTML file page per image. iiextmetadatafilter
+trims extmetadata to the license, artist and description fields we keep.
+Given a target width, iiurlwidth asks Commons for a scaled rendition, and
+the record's url points at that instead of the full-size original.
+category_tree walks subcategories (cmtype=subcat) breadth first, a level of
+categories at a time on a small thread pool, and visits each category once.
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+from . import rate_limited_request, download_image
+
+API_URL = "https://commons.wikimedia.org/w/api.php"
+CATEGORY_PAGE = "https://commons.wikimedia.org/wiki/Category:"
+
+# Titles per imageinfo query; accounts with apihighlimits may use 500
+MAX_TITLES = 50
+MAX_MEMBERS = 500
+
+# Categories listed at once while walking a category tree
+TREE_WORKERS = 4
+
+# Per-host politeness limits for every Commons source
+RATE_LIMITS = {
+    'commons.wikimedia.org': {'rate': 2.0, 'burst': 4, 'min_interval': 0.25, 'max_rate': 5.0},
+    'upload.wikimedia.org': {'rate': 4.0, 'burst': 8, 'min_interval': 0.1, 'pool_maxsize': 8,
+                             'max_rate': 16.0, 'max_concurrency': 8},
+}
+
+METADATA_FIELDS = ['License', 'LicenseShortName', 'Artist', 'ImageDescription']
+
+
+def category_title(category):
+    """'Category:Name' from a category name or its /wiki/Category: URL."""
+    if '/wiki/' in category:
+        category = unquote(category.rsplit('/wiki/', 1)[1])
+    category = category.replace(' ', '_')
+    return category if category.startswith('Category:') else f'Category:{category}'
+
+
+def category_url(category):
+    """Commons page URL of a category."""
+    return CATEGORY_PAGE + category_title(category)[len('Category:'):]
+
+
+def api_query(params):
+    """Yield the 'query' part of each response, following continue tokens."""
+    params = dict(params, action='query', format='json', formatversion=2)
+    while True:
+        data = rate_limited_request(API_URL, params=params).json()
+        if 'error' in data:
+            raise ValueError(data['error'].get('info', data['error']))
+        if 'query' in data:
+            yield data['query']
+        if 'continue' not in data:
+            return
+        params.update(data['continue'])
+
+
+def category_files(category, limit=None):
+    """File titles in a category, in category order."""
+    titles = []
+    params = {
+        'list': 'categorymembers',
+        'cmtitle': category_title(category),
+        'cmtype': 'file',
+        'cmlimit': MAX_MEMBERS if limit is None else min(MAX_MEMBERS, limit),
+    }
+    for query in api_query(params):
+        titles.extend(member['title'] for member in query.get('categorymembers', []))
+        if limit is not None and len(titles) >= limit:
+            return titles[:limit]
+    return titles
+
+
+def subcategories(category):
+    """Titles of a category's direct subcategories; [] if the listing fails."""
+    params = {
+        'list': 'categorymembers',
+        'cmtitle': category_title(category),
+        'cmtype': 'subcat',
+        'cmlimit': MAX_MEMBERS,
+    }
+    try:
+        return [member['title'] for query in api_query(params)
+                for member in query.get('categorymembers', [])]
+    except Exception as e:
+        print(f"    Error listing subcategories of {category}: {e}")
+        return []
+
+
+def category_tree(roots, max_depth=1, max_categories=None, workers=TREE_WORKERS):
+    """Categories under roots (the roots included), breadth first.
+
+    Returns dicts with 'name', 'url' and 'depth'. Categories reached twice,
+    including through cycles, are listed once; the walk stops below
+    max_depth or after max_categories categories.
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+    seen = set()
+    level = []
+    for root in roots:
+        title = category_title(root)
+        if title not in seen:
+            seen.add(title)
+            level.append(title)
+
+    found = []
+    depth = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            for title in level:
+                if max_categories is not None and len(found) >= max_categories:
+                    return found
+                name = title[len('Category:'):].replace('_', ' ')
+                found.append({'name': name, 'url': category_url(title), 'depth': depth})
+            if depth >= max_depth or (max_categories is not None and len(found) >= max_categories):
+                break
+            next_level = []
+            for titles in pool.map(subcategories, level):
+                for title in titles:
+                    title = category_title(title)
+                    if title not in seen:
+                        seen.add(title)
+                        next_level.append(title)
+            level = next_level
+            depth += 1
+    return found
+
+
+def _value(metadata, field):
+    return (metadata.get(field) or {}).get('value', '')
+
+
+def image_records(titles, category='', batch=MAX_TITLES, width=None):
+    """Records for File: titles, resolved batch titles per imageinfo call.
+
+    Records keep the order of titles; files without imageinfo are left out.
+    With width, 'url' is a rendition at most width pixels wide and
+    'original_url', 'width' and 'height' describe the original.
+    """
+    records = []
+    for start in range(0, len(titles), batch):
+        chunk = titles[start:start + batch]
+        params = {
+            'titles': '|'.join(chunk),
+            'prop': 'imageinfo',
+            'iiprop': 'url|size|extmetadata',
+            'iiextmetadatafilter': '|'.join(METADATA_FIELDS),
+        }
+        if width:
+            params['iiurlwidth'] = width
+        infos = {}
+        for query in api_query(params):
+            # A title may come back under its normalized form
+            aliases = {n['to']: n['from'] for n in query.get('normalized', [])}
+            for page in query.get('pages', []):
+                if page.get('imageinfo'):
+                    infos[aliases.get(page['title'], page['title'])] = (page['title'], page['imageinfo'][0])
+        for title in chunk:
+            if title not in infos:
+                continue
+            title, info = infos[title]
+            metadata = info.get('extmetadata', {})
+            record = {
+                'url': info.get('thumburl') or info.get('url', ''),
+                'page_url': info.get('descriptionurl', ''),
+                'title': title.replace('File:', ''),
+                'description': _value(metadata, 'ImageDescription'),
+                'license': _value(metadata, 'LicenseShortName') or _value(metadata, 'License'),
+                'artist': _value(metadata, 'Artist'),
+                'category': category,
+                'original_url': info.get('url', ''),
+                'width': info.get('width'),
+                'height': info.get('height'),
+            }
+            if info.get('thumburl'):
+                record['thumb_width'] = info.get('thumbwidth')
+                record['thumb_height'] = info.get('thumbheight')
+            records.append(record)
+    return records
+
+
+def fetch_category_images(category, limit=100, batch=MAX_TITLES, width=None):
+    """Image records for up to limit files of a category, scaled to width if given."""
+    name = category_title(category)[len('Category:'):]
+    return image_records(category_files(category, limit), category=name, batch=batch, width=width)
+
+
+def download_original(image_path, dest_path=None):
+    """Fetch the full-size original of a downloaded rendition on demand.
+
+    original_url comes from the image's metadata file; the original is saved
+    beside the rendition unless dest_path is given.
+    """
+    with open(str(image_path) + '.json') as f:
+        metadata = json.load(f)
+    url = metadata.get('original_url')
+    if not url:
+        print(f"No original URL recorded for {image_path}")
+        return False
+    if dest_path is None:
+        stem = os.path.splitext(str(image_path))[0]
+        dest_path = stem + '.original' + os.path.splitext(urlsplit(url).path)[1]
+    metadata = {k: v for k, v in metadata.items() if k not in ('sha256', 'size')}
+    return download_image(url, str(dest_path), metadata)
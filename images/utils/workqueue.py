@@ -0,0 +1,238 @@
+"""
+Shared work queue for running extractors on several nodes.
+
+Discovered pages and extracted images become work items in one SQLite
+database, which may live on a filesystem every node mounts. An item's key is
+its kind and canonical URL, so a URL is queued once however many pages or
+sources lead to it. Workers claim items by lease: a claimed item belongs to
+one node until it is completed or its lease runs out, and a worker renews the
+leases of the items it is still working on. A node that dies leaves its
+items to be claimed again once their leases expire.
+
+The database uses a rollback journal rather than WAL, because WAL needs
+shared memory that network filesystems do not provide. A local path is the
+stand-in for tests and single-machine runs.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .frontier import canonicalize_url
+from . import share_host_limits
+
+LEASE_SECONDS = 300     # how long a claimed item stays with its worker
+MAX_ATTEMPTS = 3        # failed items are retried up to this many tries
+POLL_SECONDS = 5        # idle wait before looking for new work
+BUSY_TIMEOUT = 60       # seconds to wait for another node's write lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT UNIQUE NOT NULL,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS items_ready ON items (status, lease_until);
+"""
+
+_OUTCOMES = {True: 'done', False: 'failed', None: 'skipped'}
+
+
+def node_name():
+    """Name identifying this worker process across nodes."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Page and image work items shared by the worker nodes."""
+
+    def __init__(self, path, lease=LEASE_SECONDS, node=None):
+        self.path = str(path)
+        self.lease = lease
+        self.node = node or node_name()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=DELETE')
+        with self._lock:
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _write(self, func):
+        """Run func(db) in one write transaction, holding the database lock."""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self._db)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    def put(self, source, kind, item):
+        """Queue a page or image dict; False if its URL is already queued."""
+        return self.put_many(source, kind, [item]) == 1
+
+    def put_many(self, source, kind, items):
+        """Queue several items at once; returns how many were new."""
+        rows = [(f"{kind}:{canonicalize_url(item['url'])}", source, kind, json.dumps(item))
+                for item in items if item.get('url')]
+
+        def insert(db):
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO items (key, source, kind, data) VALUES (?, ?, ?, ?)', rows)
+            return db.total_changes - before
+        return self._write(insert)
+
+    def claim(self, limit=1, sources=None):
+        """Lease up to limit ready items, images first; returns dicts with 'id', 'source', 'kind', 'item'."""
+        where = "(status = 'pending' OR (status = 'leased' AND lease_until < ?))"
+        args = [time.time()]
+        if sources is not None:
+            where += f" AND source IN ({','.join('?' * len(sources))})"
+            args += list(sources)
+
+        def lease(db):
+            rows = db.execute(f"SELECT id, source, kind, data FROM items WHERE {where} "
+                              f"ORDER BY kind = 'image' DESC, id LIMIT ?", args + [limit]).fetchall()
+            db.executemany("UPDATE items SET status = 'leased', owner = ?, lease_until = ? WHERE id = ?",
+                           [(self.node, time.time() + self.lease, row[0]) for row in rows])
+            return rows
+        return [{'id': id, 'source': source, 'kind': kind, 'item': json.loads(data)}
+                for id, source, kind, data in self._write(lease)]
+
+    def renew(self, ids):
+        """Extend the leases this node still holds on ids."""
+        if not ids:
+            return
+        self._write(lambda db: db.executemany(
+            "UPDATE items SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+            [(time.time() + self.lease, id, self.node) for id in ids]))
+
+    def complete(self, id, outcome):
+        """Record an outcome (True, False, or None when skipped) for a leased item.
+
+        A failure goes back to pending until MAX_ATTEMPTS. Returns False if
+        the lease had already passed to another node.
+        """
+        def finish(db):
+            row = db.execute("SELECT attempts FROM items WHERE id = ? AND owner = ? AND status = 'leased'",
+                             (id, self.node)).fetchone()
+            if not row:
+                return False
+            status = _OUTCOMES[outcome]
+            if status == 'failed' and row[0] + 1 < MAX_ATTEMPTS:
+                status = 'pending'
+            db.execute('UPDATE items SET status = ?, attempts = attempts + 1, lease_until = 0 WHERE id = ?',
+                       (status, id))
+            return True
+        return self._write(finish)
+
+    def counts(self, sources=None):
+        """Item counts by status."""
+        sql = 'SELECT status, COUNT(*) FROM items'
+        args = []
+        if sources is not None:
+            sql += f" WHERE source IN ({','.join('?' * len(sources))})"
+            args = list(sources)
+        with self._lock:
+            return dict(self._db.execute(sql + ' GROUP BY status', args).fetchall())
+
+    def unfinished(self, sources=None):
+        """Items still pending or leased."""
+        counts = self.counts(sources)
+        return counts.get('pending', 0) + counts.get('leased', 0)
+
+
+def seed(queue, source):
+    """Queue a source's discovered pages; returns how many were new."""
+    pages = list(source.discover())
+    return queue.put_many(source.name, 'page', pages)
+
+
+def work(queue, sources, workers=8, batch=None, stop_when_idle=True):
+    """Process queued items for sources (a {name: Source} dict) until none are left.
+
+    Pages are extracted and their images queued; images are downloaded.
+    A new item is claimed whenever a worker thread finishes one, at most
+    batch at a time. Returns counts of the outcomes this node recorded.
+    """
+    share_host_limits()
+    batch = batch or workers
+    names = list(sources)
+    held = set()
+    held_lock = threading.Lock()
+    stopped = threading.Event()
+    result = {'pages': 0, 'images': 0, 'downloaded': 0, 'failed': 0, 'skipped': 0, 'lost': 0}
+
+    def heartbeat():
+        while not stopped.wait(queue.lease / 3):
+            with held_lock:
+                ids = list(held)
+            queue.renew(ids)
+
+    def process(claimed):
+        source = sources[claimed['source']]
+        item = claimed['item']
+        try:
+            if claimed['kind'] == 'page':
+                images = source.extract(item) or []
+                if source.filter:
+                    images = [img for img in images if source.filter.allows(img)]
+                queue.put_many(source.name, 'image', images)
+                outcome = True
+            else:
+                outcome = source.download(item, claimed['id'])
+        except Exception as e:
+            print(f"    Error on {item.get('url', '')}: {e}")
+            outcome = False
+        finally:
+            with held_lock:
+                held.discard(claimed['id'])
+        recorded = queue.complete(claimed['id'], outcome)
+        with held_lock:
+            if not recorded:
+                result['lost'] += 1
+            elif claimed['kind'] == 'page':
+                result['pages'] += 1
+            else:
+                result['images'] += 1
+                result['downloaded' if outcome is True else 'skipped' if outcome is None else 'failed'] += 1
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    running = set()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Claim only as many items as there are idle workers, so no
+                # lease is held by an item still waiting for a thread
+                if len(running) < workers:
+                    claimed = queue.claim(min(batch, workers - len(running)), names)
+                    with held_lock:
+                        held.update(c['id'] for c in claimed)
+                    running |= {pool.submit(process, c) for c in claimed}
+                if running:
+                    done, running = wait(running, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                    continue
+                if stop_when_idle and not queue.unfinished(names):
+                    break
+                time.sleep(POLL_SECONDS)
+    finally:
+        stopped.set()
+    return result